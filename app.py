@@ -1,10 +1,23 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
-import joblib
-from PIL import Image
+from quantumloan.audit import get_audit_log
+from quantumloan.bundle import get_bundle, bundle_stats
+from quantumloan.cache import feature_key, get_prediction_cache
+from quantumloan.drift import get_drift_monitor
+from quantumloan.explain import explain_matrix
+from quantumloan.features import encode_records, scale_matrix
+from quantumloan.inference import ScoreResult, score_matrix
+from quantumloan.metrics import (
+    FALLBACKS, METRICS_PORT, PREDICTIONS, STAGE_SECONDS, maybe_dump, start_http_server,
+)
+from quantumloan.shadow import get_shadow_scorer
+from quantumloan.timing import StageTimer
+import logging
+import os
+import textwrap
 import time
-import random
+
+logger = logging.getLogger(__name__)
 
 # Set page configuration
 st.set_page_config(
@@ -13,12 +26,84 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+rerun_start = time.perf_counter()
+
+# Local Prometheus endpoint (QUANTUMLOAN_METRICS_PORT), one per process
+if METRICS_PORT:
+    start_http_server(METRICS_PORT)
+
+# Fast path: progress follows real inference instead of the fixed 2 s
+# animation. On by default; set QUANTUMLOAN_FAST_PATH=0 for the demo loop.
+FAST_PATH = os.environ.get("QUANTUMLOAN_FAST_PATH", "1") != "0"
+
+# Lean UI: submits rerun only the form-and-results fragment, and the
+# matrix-rain canvas is left out. On by default; QUANTUMLOAN_LEAN_UI=0 restores
+# full-page reruns.
+LEAN_UI = os.environ.get("QUANTUMLOAN_LEAN_UI", "1") != "0"
+
+# Display names for the model's features in the Key Factors cards
+FACTOR_LABELS = {
+    "Gender": "Gender",
+    "Married": "Marital Status",
+    "Dependents": "Dependents",
+    "Education": "Education",
+    "Self_Employed": "Employment Status",
+    "ApplicantIncome": "Applicant Income",
+    "CoapplicantIncome": "Co-applicant Income",
+    "LoanAmount": "Loan Amount",
+    "Loan_Amount_Term": "Loan Term",
+    "Credit_History": "Credit History",
+    "Property_Area": "Property Area",
+}
+
+# Card icons and value formatting for counterfactual options
+OPTION_ICONS = {
+    "LoanAmount": "🔻",
+    "Loan_Amount_Term": "📅",
+    "CoapplicantIncome": "👥",
+    "Credit_History": "💳",
+}
+
+
+def format_option_value(feature, value):
+    if feature == "Credit_History":
+        return "Good" if value >= 1 else "Bad"
+    if feature == "Loan_Amount_Term":
+        return f"{value:.0f} months"
+    if feature == "LoanAmount":
+        return f"${value:,.0f}K"
+    return f"${value:,.0f}"
+
 
-# Load the trained model, scaler, and encoders
+def section_header(title, subtitle):
+    return (
+        '<hr><div style="text-align: center; margin-bottom: 2rem;">'
+        f'<h2 class="rainbow-text">{title}</h2><p>{subtitle}</p></div>'
+    )
+
+
+def card_row(cards):
+    """Cards side by side in one HTML block (replaces a row of st.columns)."""
+    cells = "".join(f'<div style="flex: 1; min-width: 0;">{card}</div>' for card in cards)
+    return f'<div style="display: flex; gap: 1rem;">{cells}</div>'
+
+
+def note_card(text):
+    return f'<div class="info-card"><p>{text}</p></div>'
+
+
+# Static result-section headers
+RESULTS_HEADER = section_header("📋 Prediction Results", "Quantum AI has completed its analysis")
+FACTORS_HEADER = section_header("📈 Key Factors Influencing This Decision",
+                                "These factors had the most impact on your loan prediction")
+OPTIONS_HEADER = section_header("💡 Alternative Options",
+                                "Consider these alternatives to improve your chances")
+
+# Load the trained model, scaler, and encoders (cached once per process)
 try:
-    model = joblib.load('loan_approval.pkl')
-    scaler = joblib.load('scaler.pkl')
-    label_encoder = joblib.load('label_encoders.pkl')
+    bundle = get_bundle()
+    scaler = bundle.scaler
+    label_encoder = bundle.encoders
     model_loaded = True
 except Exception as e:
     st.error(f"Error loading model files: {str(e)}. Using demo mode.")
@@ -297,8 +382,10 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Matrix rain effect in background
-st.markdown("""
+# Matrix rain effect in background. Script tags in st.markdown are never
+# executed by the frontend, so in the lean UI this is just dead page weight.
+if not LEAN_UI:
+    st.markdown("""
 <canvas id="matrix-canvas" class="matrix-rain"></canvas>
 <script>
     const canvas = document.getElementById('matrix-canvas');
@@ -410,222 +497,287 @@ with st.sidebar:
         <p>Please provide accurate information for the best prediction results</p>
     </div>
     """, unsafe_allow_html=True)
-    
-    # Create a form for user input in sidebar
-    with st.form("loan_form"):
-        st.markdown("#### 👤 Personal Details")
-        gender = st.selectbox("Gender", ["Male", "Female"])
-        married = st.selectbox("Marital Status", ["Single", "Married"])
-        dependents = st.selectbox("Number of Dependents", ["0", "1", "2", "3+"])
-        education = st.selectbox("Education", ["Graduate", "Not Graduate"])
-        self_employed = st.selectbox("Employment Status", ["Yes", "No"])
+
+
+def prediction_panel():
+    """The form and everything drawn for a submission.
+
+    In the lean UI this runs as a fragment: a submit reruns only this
+    function, so the page chrome above and below it is not rebuilt or
+    re-sent.
+    """
+    panel_start = time.perf_counter()
+    with st.sidebar:
+        # Create a form for user input in sidebar
+        with st.form("loan_form"):
+            st.markdown("#### 👤 Personal Details")
+            gender = st.selectbox("Gender", ["Male", "Female"])
+            married = st.selectbox("Marital Status", ["Single", "Married"])
+            dependents = st.selectbox("Number of Dependents", ["0", "1", "2", "3+"])
+            education = st.selectbox("Education", ["Graduate", "Not Graduate"])
+            self_employed = st.selectbox("Employment Status", ["Yes", "No"])
         
-        st.markdown("#### 💰 Financial Information")
-        applicant_income = st.number_input("Applicant Income ($)", min_value=0, value=5000, step=500)
-        coapplicant_income = st.number_input("Co-applicant Income ($)", min_value=0, value=0, step=500)
-        loan_amount = st.number_input("Loan Amount (Thousands $)", min_value=0, value=100, step=10)
-        loan_term = st.selectbox("Loan Term (Months)", [360, 180, 120, 60, 12])
-        credit_history = st.selectbox("Credit History", ["Good", "Bad"])
-        property_area = st.selectbox("Property Area", ["Urban", "Semiurban", "Rural"])
+            st.markdown("#### 💰 Financial Information")
+            applicant_income = st.number_input("Applicant Income ($)", min_value=0, value=5000, step=500)
+            coapplicant_income = st.number_input("Co-applicant Income ($)", min_value=0, value=0, step=500)
+            loan_amount = st.number_input("Loan Amount (Thousands $)", min_value=0, value=100, step=10)
+            loan_term = st.selectbox("Loan Term (Months)", [360, 180, 120, 60, 12])
+            credit_history = st.selectbox("Credit History", ["Good", "Bad"])
+            property_area = st.selectbox("Property Area", ["Urban", "Semiurban", "Rural"])
         
-        # Form submit button
-        submitted = st.form_submit_button("🚀 Predict Loan Approval")
+            # Form submit button
+            submitted = st.form_submit_button("🚀 Predict Loan Approval")
 
-# When form is submitted
-if submitted:
-    # Show enhanced loading animation
-    with st.spinner("Quantum AI processing your data..."):
+        # Bundle load stats, to confirm the model is only loaded once per process
+        if model_loaded:
+            stats = bundle_stats()
+            st.caption(
+                f"Model bundle {bundle.version} · loaded {stats['load_count']}x · "
+                f"last load {stats['last_load_seconds'] * 1000:.0f} ms"
+            )
+            cache_stats = get_prediction_cache().stats()
+            st.caption(
+                f"Prediction cache: {cache_stats['size']} entries · {cache_stats['hits']} hits · "
+                f"{cache_stats['misses']} misses · {cache_stats['evictions']} evictions"
+            )
+
+    # When form is submitted
+    if submitted:
         progress_placeholder = st.empty()
         progress_bar = progress_placeholder.progress(0)
-        
-        # Create a more engaging loading animation
-        for i in range(100):
-            time.sleep(0.02)
-            progress_bar.progress(i + 1)
-            
-            # Update the visualization during loading
-            if i % 10 == 0:
-                viz_placeholder.markdown(f"""
-                <div class="cyber-border" style="text-align: center; padding: 1.5rem; background: rgba(0, 0, 0, 0.5); border-radius: 20px;">
-                    <div style="font-size: 5rem; margin-bottom: 1rem;" class="floating">{"🔍" if i < 33 else "📈" if i < 66 else "🤖"}</div>
-                    <h3 class="neon-text">{"Analyzing Data" if i < 33 else "Processing Patterns" if i < 66 else "Finalizing Prediction"}</h3>
-                    <p>Quantum AI at work...</p>
-                    <div style="height: 10px; background: rgba(255, 255, 255, 0.2); border-radius: 5px; overflow: hidden; margin: 1rem 0;">
-                        <div style="height: 100%; width: {i+1}%; background: linear-gradient(90deg, #00fffb, #0081ff); border-radius: 5px;"></div>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-    
-    # Clear the progress bar
-    progress_placeholder.empty()
-    
-    # Prepare data for prediction
-    # Convert categorical inputs to numerical values
-    gender_num = 1 if gender == "Male" else 0
-    married_num = 1 if married == "Married" else 0
-    dependents_num = 3 if dependents == "3+" else int(dependents)
-    education_num = 1 if education == "Graduate" else 0
-    self_employed_num = 1 if self_employed == "Yes" else 0
-    credit_history_num = 1 if credit_history == "Good" else 0
-    
-    # Property area encoding (one-hot encoding)
-    property_area_urban = 1 if property_area == "Urban" else 0
-    property_area_semiurban = 1 if property_area == "Semiurban" else 0
-    property_area_rural = 1 if property_area == "Rural" else 0
-    
-    # Create additional features that might have been used during training
-    total_income = applicant_income + coapplicant_income
-    loan_income_ratio = loan_amount / total_income if total_income > 0 else 0
-    emi = loan_amount / loan_term if loan_term > 0 else 0
-    income_emi_ratio = total_income / emi if emi > 0 else 0
-    
-    # Create input array for prediction with 14 features
-    input_data = np.array([[
-        gender_num, married_num, dependents_num, education_num, 
-        self_employed_num, applicant_income, coapplicant_income, 
-        loan_amount, loan_term, credit_history_num, total_income,
-        loan_income_ratio, emi, income_emi_ratio
-    ]])
-    
-    # Make prediction
-    if model_loaded:
-        try:
-            # Scale the input data
-            input_data_scaled = scaler.transform(input_data)
-            prediction_proba = model.predict_proba(input_data_scaled)[0]
-            prediction = model.predict(input_data_scaled)[0]
-            probability = prediction_proba[1] if prediction == 1 else prediction_proba[0]
-            prediction_label = "Approved" if prediction == 1 else "Rejected"
-        except Exception as e:
-            st.error(f"Error in prediction: {str(e)}")
-            prediction_label = "Approved" if np.random.random() > 0.5 else "Rejected"
+
+        if not FAST_PATH:
+            # Legacy demo animation: a fixed ~2 s loop before any real work
+            animation_start = time.perf_counter()
+            with st.spinner("Quantum AI processing your data..."):
+                for i in range(100):
+                    time.sleep(0.02)
+                    progress_bar.progress(i + 1)
+
+                    # Update the visualization during loading
+                    if i % 10 == 0:
+                        viz_placeholder.markdown(f"""
+                        <div class="cyber-border" style="text-align: center; padding: 1.5rem; background: rgba(0, 0, 0, 0.5); border-radius: 20px;">
+                            <div style="font-size: 5rem; margin-bottom: 1rem;" class="floating">{"🔍" if i < 33 else "📈" if i < 66 else "🤖"}</div>
+                            <h3 class="neon-text">{"Analyzing Data" if i < 33 else "Processing Patterns" if i < 66 else "Finalizing Prediction"}</h3>
+                            <p>Quantum AI at work...</p>
+                            <div style="height: 10px; background: rgba(255, 255, 255, 0.2); border-radius: 5px; overflow: hidden; margin: 1rem 0;">
+                                <div style="height: 100%; width: {i+1}%; background: linear-gradient(90deg, #00fffb, #0081ff); border-radius: 5px;"></div>
+                            </div>
+                        </div>
+                        """, unsafe_allow_html=True)
+            STAGE_SECONDS.observe(time.perf_counter() - animation_start, source="app", stage="animation")
+
+        # Progress follows the real inference stages: one update per stage.
+        # A folded forest takes unscaled features, so there is no scale stage.
+        if model_loaded and bundle.folded is not None:
+            INFERENCE_STAGES = ("encode", "predict", "explain", "search")
+        else:
+            INFERENCE_STAGES = ("encode", "scale", "predict", "explain", "search")
+
+        def show_stage(name, index):
+            done = index + 1
+            progress_bar.progress(done * 100 // len(INFERENCE_STAGES),
+                                  text=f"{name} done ({done}/{len(INFERENCE_STAGES)})")
+
+        # Stage timings also feed the process-wide latency histograms
+        timer = StageTimer(on_stage=show_stage, histogram=STAGE_SECONDS, labels={"source": "app"})
+
+        # Make prediction
+        input_data = None
+        approval_probability = None
+        if model_loaded:
+            try:
+                with timer.stage("encode"):
+                    # Map the form inputs onto the raw dataset values and run the
+                    # shared feature pipeline (same encoding the model was trained with)
+                    applicant = {
+                        "Gender": gender,
+                        "Married": "Yes" if married == "Married" else "No",
+                        "Dependents": dependents,
+                        "Education": education,
+                        "Self_Employed": self_employed,
+                        "ApplicantIncome": applicant_income,
+                        "CoapplicantIncome": coapplicant_income,
+                        "LoanAmount": loan_amount,
+                        "Loan_Amount_Term": loan_term,
+                        "Credit_History": 1 if credit_history == "Good" else 0,
+                        "Property_Area": property_area,
+                    }
+                    input_data = encode_records([applicant], label_encoder)
+
+                # Repeat and what-if submissions are served from the shared cache
+                cache = get_prediction_cache()
+                cache_key = feature_key(input_data[0])
+                outcome = cache.get(bundle.version, cache_key)
+                if outcome is None:
+                    if bundle.folded is not None:
+                        # Scaler is compiled into the tree thresholds
+                        with timer.stage("predict"):
+                            result = score_matrix(bundle, input_data)
+                    else:
+                        # Scale the input data
+                        with timer.stage("scale"):
+                            input_data_scaled = scale_matrix(input_data, scaler)
+                        with timer.stage("predict"):
+                            result = ScoreResult(bundle, bundle.predict_proba(input_data_scaled))
+                    outcome = result.row(0)
+                if "factors" not in outcome:
+                    # Per-prediction drivers from the trees' decision paths,
+                    # cached together with the outcome for this feature vector
+                    with timer.stage("explain"):
+                        explanation = explain_matrix(bundle, input_data)
+                    # Cheapest changes to amount, term, co-applicant income or
+                    # credit history that would flip a rejection
+                    with timer.stage("search"):
+                        options = bundle.counterfactuals.search(input_data, k=3)[0]
+                    outcome = dict(outcome, factors=explanation.top(0, 4), options=options)
+                    cache.put(bundle.version, cache_key, outcome)
+                # Label and confidence come from the same single forest pass
+                probability = outcome["confidence"]
+                prediction_label = outcome["decision"]
+                approval_probability = outcome["approval_probability"]
+                PREDICTIONS.inc(source="app", outcome=prediction_label)
+                factors = outcome["factors"]
+                options = outcome["options"]
+            except Exception as e:
+                st.error(f"Error in prediction: {str(e)}")
+                FALLBACKS.inc(source="app", reason="prediction_error")
+                # The label below is made up, not the model's
+                approval_probability = None
+                factors = options = None
+                prediction_label = "Approved" if np.random.random() > 0.5 else "Rejected"
+                probability = np.random.uniform(0.8, 0.98) if prediction_label == "Approved" else np.random.uniform(0.6, 0.75)
+        else:
+            # Demo mode if model not loaded
+            FALLBACKS.inc(source="app", reason="model_not_loaded")
+            factors = options = None
+            prediction_label = "Approved" if np.random.random() > 0.3 else "Rejected"
             probability = np.random.uniform(0.8, 0.98) if prediction_label == "Approved" else np.random.uniform(0.6, 0.75)
-    else:
-        # Demo mode if model not loaded
-        prediction_label = "Approved" if np.random.random() > 0.3 else "Rejected"
-        probability = np.random.uniform(0.8, 0.98) if prediction_label == "Approved" else np.random.uniform(0.6, 0.75)
-    
-    # Display result with enhanced flair
-    st.markdown("---")
-    st.markdown("""
-    <div style="text-align: center; margin-bottom: 2rem;">
-        <h2 class="rainbow-text">📋 Prediction Results</h2>
-        <p>Quantum AI has completed its analysis</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    if prediction_label == "Approved":
-        st.balloons()
-        st.markdown(f"""
-        <div class="success">
-            <div style="font-size: 4rem; margin-bottom: 1rem;">🎉</div>
-            <h2 class="neon-text">LOAN APPROVED!</h2>
-            <p>Congratulations! Your loan application has been approved with a confidence level of {probability:.2%}</p>
-            <div style="background: rgba(0, 0, 0, 0.2); padding: 1.5rem; border-radius: 15px; margin: 1.5rem 0;">
-                <h3>Next Steps:</h3>
-                <p>1. Our representative will contact you within 24 hours</p>
-                <p>2. Prepare your documents for verification</p>
-                <p>3. Final disbursement within 3-5 business days</p>
+
+        if approval_probability is not None:
+            # Monitoring never changes the decision already made
+            try:
+                # Served inputs and scores are compared with the training data
+                drift_monitor = get_drift_monitor(bundle)
+                if drift_monitor is not None:
+                    drift_monitor.update(input_data, [approval_probability])
+                # Challenger bundles score the same input off this thread
+                shadow = get_shadow_scorer()
+                if shadow is not None:
+                    shadow.submit(bundle, input_data, [prediction_label == "Approved"],
+                                  [approval_probability])
+            except Exception:
+                logger.exception("Drift or shadow monitoring failed")
+
+        # Every decision shown, model or fallback, goes to the audit log
+        # (queued here, written in batches by a background thread)
+        audit_log = get_audit_log()
+        if audit_log is not None:
+            audit_log.record(
+                input_data if input_data is not None else np.full(11, np.nan),
+                prediction_label == "Approved", probability, approval_probability,
+                version=bundle.version if model_loaded else "", source="app",
+                fallback="" if approval_probability is not None
+                else ("prediction_error" if model_loaded else "model_not_loaded"),
+            )
+
+        # Clear the progress bar
+        progress_placeholder.empty()
+
+        # Per-stage inference latency
+        cached_note = " (served from prediction cache)" if model_loaded and "predict" not in timer.timings else ""
+        st.caption(f"⏱️ Inference latency — {timer.summary()}{cached_note}")
+
+        # Display result with enhanced flair. The whole result is one HTML
+        # block written to one placeholder: a single delta per submit instead
+        # of a dozen markdown elements and column blocks.
+        render_start = time.perf_counter()
+        if prediction_label == "Approved":
+            st.balloons()
+            verdict = f"""
+            <div class="success">
+                <div style="font-size: 4rem; margin-bottom: 1rem;">🎉</div>
+                <h2 class="neon-text">LOAN APPROVED!</h2>
+                <p>Congratulations! Your loan application has been approved with a confidence level of {probability:.2%}</p>
+                <div style="background: rgba(0, 0, 0, 0.2); padding: 1.5rem; border-radius: 15px; margin: 1.5rem 0;">
+                    <h3>Next Steps:</h3>
+                    <p>1. Our representative will contact you within 24 hours</p>
+                    <p>2. Prepare your documents for verification</p>
+                    <p>3. Final disbursement within 3-5 business days</p>
+                </div>
             </div>
-        </div>
-        """, unsafe_allow_html=True)
-    else:
-        st.markdown(f"""
-        <div class="reject">
-            <div style="font-size: 4rem; margin-bottom: 1rem;">❌</div>
-            <h2 class="neon-text">LOAN REJECTED</h2>
-            <p>We're sorry, but your application wasn't approved at this time.</p>
-            <p>Confidence level: {probability:.2%}</p>
-            <div style="background: rgba(0, 0, 0, 0.2); padding: 1.5rem; border-radius: 15px; margin: 1.5rem 0;">
-                <h3>Suggestions:</h3>
-                <p>1. Improve your credit score</p>
-                <p>2. Consider adding a co-applicant with higher income</p>
-                <p>3. Try again in 6 months</p>
+            """
+        else:
+            verdict = f"""
+            <div class="reject">
+                <div style="font-size: 4rem; margin-bottom: 1rem;">❌</div>
+                <h2 class="neon-text">LOAN REJECTED</h2>
+                <p>We're sorry, but your application wasn't approved at this time.</p>
+                <p>Confidence level: {probability:.2%}</p>
+                <div style="background: rgba(0, 0, 0, 0.2); padding: 1.5rem; border-radius: 15px; margin: 1.5rem 0;">
+                    <h3>Suggestions:</h3>
+                    <p>1. Improve your credit score</p>
+                    <p>2. Consider adding a co-applicant with higher income</p>
+                    <p>3. Try again in 6 months</p>
+                </div>
             </div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    # Additional information with enhanced cards
-    st.markdown("---")
-    st.markdown("""
-    <div style="text-align: center; margin-bottom: 2rem;">
-        <h2 class="rainbow-text">📈 Key Factors Influencing This Decision</h2>
-        <p>These factors had the most impact on your loan prediction</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    factors_col1, factors_col2, factors_col3, factors_col4 = st.columns(4)
-    
-    with factors_col1:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>User's Credit History</h3>
-            <h2 style="color: #00fffb;">High</h2>
-            <p>35% weight</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with factors_col2:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>Income Stability</h3>
-            <h2 style="color: #00fffb;">Medium</h2>
-            <p>25% weight</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with factors_col3:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>Loan Amount Ratio</h3>
-            <h2 style="color: #00fffb;">Low</h2>
-            <p>15% weight</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-    with factors_col4:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>Employment Status</h3>
-            <h2 style="color: #00fffb;">Medium</h2>
-            <p>10% weight</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    # Offer alternative options with enhanced cards
-    st.markdown("---")
-    st.markdown("""
-    <div style="text-align: center; margin-bottom: 2rem;">
-        <h2 class="rainbow-text">💡 Alternative Options</h2>
-        <p>Consider these alternatives to improve your chances</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    alt_col1, alt_col2, alt_col3 = st.columns(3)
-    
-    with alt_col1:
-        st.markdown("""
-        <div class="info-card">
-            <h3>🔻 Lower Amount</h3>
-            <p>Consider applying for a smaller loan amount to increase approval chances</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with alt_col2:
-        st.markdown("""
-        <div class="info-card">
-            <h3>📅 Extended Term</h3>
-            <p>A longer repayment period might help reduce monthly payments</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with alt_col3:
-        st.markdown("""
-        <div class="info-card">
-            <h3>👥 Co-signer Option</h3>
-            <p>Add a creditworthy co-signer to strengthen your application</p>
-        </div>
-        """, unsafe_allow_html=True)
+            """
+
+        if factors:
+            # Signed shift of the approval probability attributed to each feature
+            factor_cards = []
+            for feature, contribution in factors:
+                direction = "toward approval" if contribution >= 0 else "toward rejection"
+                color = "#96c93d" if contribution >= 0 else "#ff416c"
+                factor_cards.append(
+                    f'<div class="metric-card"><h3>{FACTOR_LABELS.get(feature, feature)}</h3>'
+                    f'<h2 style="color: {color};">{contribution * 100:+.1f} pts</h2>'
+                    f"<p>{direction}</p></div>"
+                )
+            factors_html = card_row(factor_cards)
+        else:
+            factors_html = note_card("Factor breakdown is only available for model predictions.")
+
+        if options:
+            current_values = {
+                "LoanAmount": loan_amount,
+                "Loan_Amount_Term": loan_term,
+                "CoapplicantIncome": coapplicant_income,
+                "Credit_History": 1 if credit_history == "Good" else 0,
+            }
+            option_cards = []
+            for option in options:
+                changes = "".join(
+                    f"<p>{FACTOR_LABELS[feature]}: {format_option_value(feature, current_values[feature])}"
+                    f" → {format_option_value(feature, value)}</p>"
+                    for feature, value in option["changes"].items()
+                )
+                option_cards.append(
+                    f'<div class="info-card"><h3>{OPTION_ICONS[next(iter(option["changes"]))]} '
+                    f'{option["approval_probability"]:.0%} approval</h3>{changes}</div>'
+                )
+            options_html = card_row(option_cards)
+        elif options is None:
+            options_html = note_card("Alternative options are only available for model predictions.")
+        elif prediction_label == "Approved":
+            options_html = note_card("No changes needed: this application is approved as submitted.")
+        else:
+            options_html = note_card("No combination of loan amount, term, co-applicant income "
+                                     "and credit history changes flips this decision.")
+
+        st.markdown("".join([
+            RESULTS_HEADER, textwrap.dedent(verdict).strip(),
+            FACTORS_HEADER, factors_html,
+            OPTIONS_HEADER, options_html,
+        ]), unsafe_allow_html=True)
+        STAGE_SECONDS.observe(time.perf_counter() - render_start, source="app", stage="render")
+    STAGE_SECONDS.observe(time.perf_counter() - panel_start, source="app", stage="panel")
+
+
+if LEAN_UI:
+    prediction_panel = st.fragment(prediction_panel)
+prediction_panel()
 
 # Footer with enhanced design
 st.markdown("---")
@@ -641,4 +793,8 @@ st.markdown("""
         <span>🌐 www.linkedin.com/in/abhishek-thakre13</span>
     </div>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# Whole-script time of this rerun; dump metrics if QUANTUMLOAN_METRICS_FILE is set
+STAGE_SECONDS.observe(time.perf_counter() - rerun_start, source="app", stage="rerun")
+maybe_dump()
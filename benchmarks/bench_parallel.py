@@ -0,0 +1,73 @@
+"""Throughput of parallel batch scoring against worker count.
+
+    python benchmarks/bench_parallel.py --rows 1000000 --backend threads
+
+Rows are resampled (seeded) from Loan_approvals.csv, encoded and scaled once,
+then scored with 1, 2, 4, ... workers up to the core count. Speedup and
+parallel efficiency are reported relative to one worker.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantumloan.bundle import get_bundle  # noqa: E402
+from quantumloan.features import CATEGORICAL_COLUMNS, transform  # noqa: E402
+from quantumloan.parallel import BACKENDS, predict_proba_parallel  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "Loan_approvals.csv")
+
+
+def worker_counts(max_jobs):
+    counts, n = [], 1
+    while n < max_jobs:
+        counts.append(n)
+        n *= 2
+    return counts + [max_jobs]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--backend", choices=BACKENDS, default="threads")
+    parser.add_argument("--max-jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    bundle = get_bundle()
+    source = pd.read_csv(DATA, dtype={c: str for c in CATEGORICAL_COLUMNS})
+    X = transform(source.sample(args.rows, replace=True, random_state=args.seed), bundle)
+
+    results = []
+    for n_jobs in worker_counts(args.max_jobs):
+        predict_proba_parallel(X[:10_000], bundle, n_jobs=n_jobs, backend=args.backend)  # warm pool
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            predict_proba_parallel(X, bundle, n_jobs=n_jobs, backend=args.backend)
+            best = min(best, time.perf_counter() - start)
+        results.append({"n_jobs": n_jobs, "seconds": best, "rows_per_second": args.rows / best})
+
+    base = results[0]["rows_per_second"]
+    print(f"{'jobs':>4} {'seconds':>9} {'rows/s':>12} {'speedup':>8} {'efficiency':>10}")
+    for r in results:
+        r["speedup"] = r["rows_per_second"] / base
+        r["efficiency"] = r["speedup"] / r["n_jobs"]
+        print(f"{r['n_jobs']:>4} {r['seconds']:>9.3f} {r['rows_per_second']:>12,.0f} "
+              f"{r['speedup']:>8.2f} {r['efficiency']:>10.0%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"backend": args.backend, "rows": args.rows, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
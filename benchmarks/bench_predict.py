@@ -0,0 +1,57 @@
+"""Cost of the old predict_proba + predict pair against one-pass scoring.
+
+    python benchmarks/bench_predict.py
+
+The old app called ``model.predict_proba`` and then ``model.predict`` on the
+same row, walking every tree twice. ``score_matrix`` derives label,
+probabilities and confidence from a single evaluation.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantumloan.bundle import get_bundle  # noqa: E402
+from quantumloan.features import CATEGORICAL_COLUMNS, encode_frame, scale_matrix  # noqa: E402
+from quantumloan.inference import ScoreResult, score_matrix  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "Loan_approvals.csv")
+
+
+def best_of(fn, number, repeat=5):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    args = parser.parse_args(argv)
+
+    bundle = get_bundle()
+    model = bundle.model
+    source = pd.read_csv(DATA, dtype={c: str for c in CATEGORICAL_COLUMNS})
+
+    print(f"{'rows':>7} {'proba+predict':>14} {'one pass':>10} {'sklearn 1x':>11} {'saving':>7}")
+    for n in args.sizes:
+        X = encode_frame(source.sample(n, replace=True, random_state=0), bundle.encoders)
+        Xs = scale_matrix(X, bundle.scaler)
+        number = max(1, 2000 // n)
+
+        def two_pass():
+            model.predict_proba(Xs)
+            model.predict(Xs)
+
+        old = best_of(two_pass, number)
+        sk_once = best_of(lambda: ScoreResult(bundle, model.predict_proba(Xs)), number)
+        new = best_of(lambda: score_matrix(bundle, X), number)
+        print(f"{n:>7} {old * 1e3:>11.3f} ms {new * 1e3:>7.3f} ms {sk_once * 1e3:>8.3f} ms "
+              f"{old / new:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Local load test for the HTTP scoring service.
+
+    python benchmarks/load_service.py --clients 64 --requests 200
+
+Starts the service in-process (or targets ``--host/--port`` of a running
+one), opens one keep-alive connection per client and fires single-applicant
+requests back to back. Reports throughput, client-side p50/p99 latency and
+how the micro-batcher grouped the requests.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantumloan.features import CATEGORICAL_COLUMNS, FEATURE_COLUMNS  # noqa: E402
+from quantumloan.service import ScoringService  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "Loan_approvals.csv")
+
+
+async def request(reader, writer, method, path, body=b""):
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, bodies, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    for body in bodies:
+        start = time.perf_counter()
+        status, _ = await request(reader, writer, "POST", "/score", body)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        if status != 200:
+            raise RuntimeError(f"HTTP {status}")
+    writer.close()
+
+
+async def run(args):
+    service = None
+    host, port = args.host, args.port
+    if port is None:
+        service = ScoringService(max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+        host, port = await service.start(host, 0)
+
+    source = pd.read_csv(DATA, dtype={c: str for c in CATEGORICAL_COLUMNS})[FEATURE_COLUMNS]
+    records = source.sample(args.clients * args.requests, replace=True, random_state=args.seed)
+    bodies = [json.dumps(r).encode() for r in records.to_dict(orient="records")]
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(host, port, bodies[i::args.clients], latencies) for i in range(args.clients)
+    ))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, stats = await request(reader, writer, "GET", "/stats")
+    writer.close()
+    if service is not None:
+        await service.stop()
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{len(latencies)} requests from {args.clients} clients in {elapsed:.2f} s "
+          f"({len(latencies) / elapsed:,.0f} req/s)")
+    print(f"client latency p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    print(f"server latency p50 {stats['latency_ms']['p50']:.2f} ms, "
+          f"p99 {stats['latency_ms']['p99']:.2f} ms; {stats['batches']} batches, "
+          f"mean {stats['mean_batch_rows']:.1f} rows/batch")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None,
+                        help="target a running service instead of starting one")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
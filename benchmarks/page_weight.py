@@ -0,0 +1,151 @@
+"""Bytes sent and server time per interaction of the Streamlit app.
+
+    python benchmarks/page_weight.py --submits 20
+
+Starts ``streamlit run app.py`` once per UI mode (lean and full page, see
+``QUANTUMLOAN_LEAN_UI``), connects to its websocket like a browser tab would
+and submits the form repeatedly. Each submit reports the bytes of the
+messages the server sent back, the time until it reported the run finished
+and the time the script itself ran (from the app's ``/metrics`` endpoint).
+Like a browser, the client tells the server which large messages it
+already has, so bytes are what a real session would receive.
+"""
+import argparse
+import asyncio
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {"lean": "1", "full": "0"}
+
+
+def _script_seconds(metrics_port):
+    """``{stage: (seconds, runs)}`` for the app's whole reruns and panel runs."""
+    with urllib.request.urlopen(f"http://127.0.0.1:{metrics_port}/metrics", timeout=5) as r:
+        text = r.read().decode()
+    totals = {}
+    for stage in ("rerun", "panel"):
+        values = []
+        for field in ("sum", "count"):
+            m = re.search(r'quantumloan_stage_seconds_%s\{source="app",stage="%s"\} (\S+)'
+                          % (field, stage), text)
+            values.append(float(m.group(1)) if m else 0.0)
+        totals[stage] = tuple(values)
+    return totals
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_healthy(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"streamlit did not start on port {port}")
+
+
+async def _run(ws, client_state):
+    """Send one rerun request; return (bytes received, seconds, messages)."""
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    start = time.perf_counter()
+    await ws.send(BackMsg(rerun_script=client_state).SerializeToString())
+    received, messages = 0, []
+    while True:
+        data = await ws.recv()
+        received += len(data)
+        msg = ForwardMsg()
+        msg.ParseFromString(data)
+        messages.append(msg)
+        if msg.WhichOneof("type") == "script_finished":
+            return received, time.perf_counter() - start, messages
+
+
+async def _session(port, metrics_port, submits):
+    import websockets
+    from streamlit.proto.ClientState_pb2 import ClientState
+    from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream",
+                                  subprotocols=["streamlit"], max_size=None) as ws:
+        load_bytes, load_seconds, messages = await _run(ws, ClientState())
+        cached = set()
+        button = fragment = None
+        for msg in messages:
+            if msg.metadata.cacheable:
+                cached.add(msg.hash)
+            if msg.WhichOneof("type") == "delta" and msg.delta.HasField("new_element"):
+                element = msg.delta.new_element
+                if element.WhichOneof("type") == "button" and element.button.is_form_submitter:
+                    button, fragment = element.button.id, msg.delta.fragment_id
+        if button is None:
+            raise RuntimeError("form submit button not found")
+
+        sizes, seconds = [], []
+        script_before = _script_seconds(metrics_port)
+        for _ in range(submits):
+            state = ClientState(fragment_id=fragment, cached_message_hashes=sorted(cached))
+            state.widget_states.widgets.append(WidgetState(id=button, trigger_value=True))
+            size, elapsed, messages = await _run(ws, state)
+            cached.update(m.hash for m in messages if m.metadata.cacheable)
+            sizes.append(size)
+            seconds.append(elapsed)
+        script_after = _script_seconds(metrics_port)
+    # A full rerun times the panel inside it too; count each submit once, as
+    # a whole rerun if there were any, else as a fragment-only panel run
+    stage = "rerun" if script_after["rerun"][1] > script_before["rerun"][1] else "panel"
+    script_seconds = script_after[stage][0] - script_before[stage][0]
+    return {"load_bytes": load_bytes, "load_seconds": load_seconds,
+            "submit_bytes": statistics.median(sizes), "submit_seconds": statistics.median(seconds),
+            "script_seconds": script_seconds / submits}
+
+
+def measure(mode, submits):
+    port = _free_port()
+    metrics_port = _free_port()
+    env = dict(os.environ, QUANTUMLOAN_LEAN_UI=MODES[mode],
+               QUANTUMLOAN_METRICS_PORT=str(metrics_port))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "app.py"),
+         "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_healthy(port)
+        return asyncio.run(_session(port, metrics_port, submits))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submits", type=int, default=20, help="form submits per mode")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':<6} {'load':>10} {'submit':>10} {'round trip':>12} {'script':>10}")
+    for mode in args.modes:
+        r = measure(mode, args.submits)
+        print(f"{mode:<6} {r['load_bytes'] / 1e3:>8.1f}kB {r['submit_bytes'] / 1e3:>8.1f}kB "
+              f"{r['submit_seconds'] * 1e3:>10.1f}ms {r['script_seconds'] * 1e3:>8.2f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
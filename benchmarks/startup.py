@@ -0,0 +1,114 @@
+"""Time to first prediction and memory of a fresh serving process.
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --save startup.json
+    python benchmarks/startup.py --compare startup.json
+
+Each run starts a new interpreter that imports what the app imports from
+``quantumloan``, loads the bundle and scores one applicant, once with the
+memory-mapped artifact and once from the pickles (``QUANTUMLOAN_ARTIFACT``).
+It reports the wall time from process start to the first prediction, the
+time spent in imports, bundle load and the prediction, and the process's
+peak RSS. Medians over ``--runs`` are shown. With ``--compare``, figures
+worse than the saved ones by more than ``--tolerance`` are listed and the
+exit status is 1.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {"artifact": "1", "pickle": "0"}
+
+# Runs in the child; prints one JSON line
+CHILD = """
+import json, resource, time
+start = time.perf_counter()
+from quantumloan.bundle import get_bundle
+from quantumloan.cache import get_prediction_cache
+from quantumloan.explain import explain_matrix
+from quantumloan.features import encode_records
+from quantumloan.inference import score_matrix
+imported = time.perf_counter()
+bundle = get_bundle()
+loaded = time.perf_counter()
+applicant = {"Gender": "Male", "Married": "Yes", "Dependents": "0", "Education": "Graduate",
+             "Self_Employed": "No", "ApplicantIncome": 5000, "CoapplicantIncome": 0,
+             "LoanAmount": 120, "Loan_Amount_Term": 360, "Credit_History": 1,
+             "Property_Area": "Urban"}
+score_matrix(bundle, encode_records([applicant], bundle.encoders)).row(0)
+done = time.perf_counter()
+print(json.dumps({"import_seconds": imported - start, "load_seconds": loaded - imported,
+                  "predict_seconds": done - loaded,
+                  "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+FIELDS = ("first_prediction_seconds", "import_seconds", "load_seconds", "predict_seconds", "rss_mb")
+
+
+def run_once(mode, bundle_dir):
+    env = dict(os.environ, QUANTUMLOAN_ARTIFACT=MODES[mode], PYTHONWARNINGS="ignore")
+    if bundle_dir:
+        env["QUANTUMLOAN_BUNDLE_DIR"] = bundle_dir
+    # Includes interpreter start-up and exit, the same for both modes
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["first_prediction_seconds"] = time.perf_counter() - start
+    return result
+
+
+def measure(mode, runs, bundle_dir=None):
+    samples = [run_once(mode, bundle_dir) for _ in range(runs)]
+    return {field: statistics.median(s[field] for s in samples) for field in FIELDS}
+
+
+def compare(results, baseline, tolerance):
+    """(name, ratio) of figures worse than baseline by more than tolerance."""
+    regressions = []
+    for mode, figures in results.items():
+        for field in ("first_prediction_seconds", "rss_mb"):
+            old = baseline.get(mode, {}).get(field)
+            if old:
+                ratio = figures[field] / old
+                print(f"{mode}/{field:<26} {old:>10.3f} {figures[field]:>10.3f} {ratio:>6.2f}x")
+                if ratio > 1 + tolerance:
+                    regressions.append((f"{mode}/{field}", ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--bundle-dir", default=None)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'mode':<9} {'first':>9} {'imports':>9} {'load':>9} {'predict':>9} {'rss':>9}")
+    for mode in args.modes:
+        r = results[mode] = measure(mode, args.runs, args.bundle_dir)
+        print(f"{mode:<9} {r['first_prediction_seconds'] * 1e3:>7.0f}ms "
+              f"{r['import_seconds'] * 1e3:>7.0f}ms {r['load_seconds'] * 1e3:>7.1f}ms "
+              f"{r['predict_seconds'] * 1e3:>7.2f}ms {r['rss_mb']:>7.1f}MB")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions: " + ", ".join(f"{n} ({r:.2f}x)" for n, r in regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
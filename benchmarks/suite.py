@@ -0,0 +1,198 @@
+"""Benchmark every stage of the prediction path and compare with a baseline.
+
+    python benchmarks/suite.py --save results.json
+    python benchmarks/suite.py --compare benchmarks/baseline.json
+
+Stages are timed separately: bundle load, the app's feature construction,
+scaling, ``predict_proba`` from 1 to 100k rows, and the form-submit
+handler end to end. Inputs are seeded resamples of ``Loan_approvals.csv``,
+so runs are deterministic and need no network. Each benchmark reports the
+best of ``--repeat`` runs. With ``--compare``, benchmarks slower than the
+baseline by more than ``--tolerance`` are listed and the exit status is 1.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from quantumloan.bundle import ARTIFACTS, load_bundle  # noqa: E402
+from quantumloan.cache import PredictionCache, feature_key  # noqa: E402
+from quantumloan.features import (  # noqa: E402
+    CATEGORICAL_COLUMNS, FEATURE_COLUMNS, encode_frame, encode_records, scale_matrix,
+)
+from quantumloan.inference import score_matrix  # noqa: E402
+
+DATA = os.path.join(ROOT, "Loan_approvals.csv")
+BATCH_SIZES = [1, 10, 100, 1_000, 10_000, 100_000]
+SCALE_ROWS = 10_000
+
+
+def measure(fn, rows=1, repeat=5, target=0.2):
+    """Best and median seconds per call, with the loop count auto-sized."""
+    number = 1
+    while number < 1_000_000:
+        if timeit.timeit(fn, number=number) >= target / 10:
+            break
+        number *= 10
+    runs = [t / number for t in timeit.repeat(fn, number=number, repeat=repeat)]
+    return {"seconds": min(runs), "median_seconds": statistics.median(runs),
+            "number": number, "rows": rows}
+
+
+def form_submit(bundle, cache):
+    """The model path of the app's form submit, without Streamlit."""
+    def submit(applicant):
+        X = encode_records([applicant], bundle.encoders)
+        key = feature_key(X[0])
+        outcome = cache.get(bundle.version, key)
+        if outcome is None:
+            outcome = score_matrix(bundle, X).row(0)
+            cache.put(bundle.version, key, outcome)
+        return outcome["confidence"], outcome["decision"]
+    return submit
+
+
+def run_suite(bundle_dir=ROOT, repeat=5, seed=0, sizes=BATCH_SIZES, apptest=False):
+    results = {}
+    source = pd.read_csv(DATA, dtype={c: str for c in CATEGORICAL_COLUMNS})
+    bundle = load_bundle(bundle_dir)
+
+    paths = [os.path.join(bundle_dir, f) for f in ARTIFACTS.values()]
+    results["load/joblib"] = measure(lambda: [joblib.load(p) for p in paths], repeat=repeat)
+    results["load/bundle"] = measure(lambda: load_bundle(bundle_dir), repeat=repeat)
+    results["load/bundle_pickle"] = measure(lambda: load_bundle(bundle_dir, artifact=False),
+                                            repeat=repeat)
+
+    records = source[FEATURE_COLUMNS].sample(1000, replace=True, random_state=seed)
+    records = records.astype(object).where(records.notna(), None).to_dict("records")
+    one = records[0]
+    results["features/app_record"] = measure(lambda: encode_records([one], bundle.encoders),
+                                             repeat=repeat)
+    results["features/frame_1"] = measure(
+        lambda: encode_frame(pd.DataFrame([one]), bundle.encoders), repeat=repeat)
+
+    X_big = encode_frame(source.sample(max(sizes + [SCALE_ROWS]), replace=True, random_state=seed),
+                         bundle.encoders)
+    # The artifact bundle's scaler is a table of arrays; time sklearn's own
+    sklearn_scaler = load_bundle(bundle_dir, artifact=False).scaler
+    for n in (1, SCALE_ROWS):
+        X = X_big[:n]
+        results[f"scale/sklearn_{n}"] = measure(lambda: sklearn_scaler.transform(X), n, repeat)
+        results[f"scale/scale_matrix_{n}"] = measure(lambda: scale_matrix(X, bundle.scaler), n,
+                                                     repeat)
+
+    X_scaled = scale_matrix(X_big, bundle.scaler)
+    for n in sizes:
+        Xs, X = X_scaled[:n], X_big[:n]
+        results[f"predict/sklearn_{n}"] = measure(lambda: bundle.model.predict_proba(Xs), n,
+                                                  repeat)
+        results[f"predict/bundle_{n}"] = measure(lambda: bundle.predict_proba_encoded(X), n,
+                                                 repeat)
+
+    # Cold: every submit is a new applicant; warm: the same one resubmitted
+    cold, uncached = itertools.cycle(records), form_submit(bundle, PredictionCache(maxsize=0))
+    results["submit/cold"] = measure(lambda: uncached(next(cold)), repeat=repeat)
+    warm = form_submit(bundle, PredictionCache())
+    results["submit/warm"] = measure(lambda: warm(one), repeat=repeat)
+    if apptest:
+        results["submit/streamlit"] = _apptest_submit(repeat)
+    return results
+
+
+def _apptest_submit(repeat):
+    # Full rerun of app.py including rendering, through Streamlit's test harness
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    app.run()
+
+    def submit():
+        app.button[0].click().run()
+    return measure(submit, repeat=repeat, target=1.0)
+
+
+def environment(bundle_dir):
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "bundle_version": load_bundle(bundle_dir).version,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """(name, ratio) of benchmarks slower than baseline by more than tolerance."""
+    regressions = []
+    print(f"{'benchmark':<28} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<28} {'-':>12} {_fmt(current['seconds']):>12}")
+            continue
+        ratio = current["seconds"] / base["seconds"]
+        flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:<28} {_fmt(base['seconds']):>12} {_fmt(current['seconds']):>12} "
+              f"{ratio:>6.2f}x{flag}")
+        if flag:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def _fmt(seconds):
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bundle-dir", default=ROOT)
+    parser.add_argument("--repeat", type=int, default=5, help="best of N runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--apptest", action="store_true",
+                        help="also time a full Streamlit rerun of app.py on submit")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before flagging (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.bundle_dir, args.repeat, args.seed, args.sizes, args.apptest)
+    report = {"environment": environment(args.bundle_dir), "results": results}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if not args.compare:
+        for name, r in results.items():
+            per_row = f"  ({_fmt(r['seconds'] / r['rows'])}/row)" if r["rows"] > 1 else ""
+            print(f"{name:<28} {_fmt(r['seconds']):>12}{per_row}")
+        return 0
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    if baseline["environment"] != report["environment"]:
+        print("note: environment differs from the baseline's", file=sys.stderr)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Shared scoring components for the QuantumLoan Predictor."""
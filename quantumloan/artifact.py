@@ -0,0 +1,259 @@
+"""Compact model artifact that is memory-mapped instead of unpickled.
+
+``loan_approval.qlm`` holds everything serving needs in one file: the flat
+forest arrays, the scaler's mean and scale, the encoders' class tables and
+the feature schema. Opening it maps the file and wraps the arrays in place
+with ``np.frombuffer``; nothing is unpickled and neither sklearn nor joblib
+is imported, so a process reaches its first prediction sooner and without
+their memory.
+
+Layout: 8-byte magic, little-endian uint32 format version and header
+length, a UTF-8 JSON header (schema, encoder classes, scaler flags, forest
+metadata, the hashes of the pickles it was built from, and each array's
+dtype, shape and offset), then the arrays, each aligned to 64 bytes.
+
+To keep the file small, thresholds are stored as float32 and node indices
+in the narrowest integer type that holds them. Rounding is exact: sklearn
+compares float32 inputs, so a threshold rounded down to the nearest float32
+sends every input the same way. Leaf probabilities stay float64 so
+predictions are bit-for-bit those of the pickled model.
+
+Usage::
+
+    python -m quantumloan.artifact build --check Loan_approvals.csv
+    python -m quantumloan.artifact info
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+from .forest import FlatForest
+
+ARTIFACT_FILE = "loan_approval.qlm"
+MAGIC = b"QLOANMDL"
+FORMAT_VERSION = 1
+ALIGN = 64
+_PREAMBLE = struct.Struct("<8sII")
+
+
+class ArtifactError(Exception):
+    """Raised when an artifact file is malformed or from another format version."""
+
+
+class ScalerTable:
+    """The fitted ``StandardScaler`` attributes ``scale_matrix`` and the forest use."""
+
+    def __init__(self, mean, scale, with_mean=True, with_std=True, feature_names=None):
+        self.mean_ = mean
+        self.scale_ = scale
+        self.with_mean = with_mean
+        self.with_std = with_std
+        self.n_features_in_ = len(scale)
+        if feature_names is not None:
+            self.feature_names_in_ = np.array(feature_names, dtype=object)
+
+
+class EncoderTable:
+    """A fitted ``LabelEncoder``'s class table, for encoding and decoding codes."""
+
+    def __init__(self, classes):
+        self.classes_ = np.array(classes, dtype=object)
+
+
+def _quantize_thresholds(threshold):
+    # Largest float32 <= each threshold: for float32 x, x <= t iff x <= t32
+    t32 = threshold.astype(np.float32)
+    above = t32.astype(np.float64) > threshold
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+
+def _index_dtype(n_nodes):
+    # Walks compute 2 * node + 1, which must fit too
+    for dtype in (np.int16, np.int32):
+        if 2 * n_nodes + 1 <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _feature_dtype(n_features):
+    return np.dtype(np.int8 if n_features <= np.iinfo(np.int8).max else np.int32)
+
+
+def pack_arrays(arrays, align=ALIGN):
+    """``(table, data)``: each array's dtype, shape and offset, and their bytes.
+
+    Arrays are laid out in order, each starting on an ``align``-byte boundary
+    of ``data``.
+    """
+    table, chunks, offset = {}, [], 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        table[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        padding = -array.nbytes % align
+        chunks += [array.tobytes(), b"\0" * padding]
+        offset += array.nbytes + padding
+    return table, b"".join(chunks)
+
+
+def unpack_arrays(buffer, table, offset=0):
+    """Arrays described by ``table`` as read-only views of ``buffer`` at ``offset``."""
+    arrays = {}
+    for name, spec in table.items():
+        arrays[name] = np.frombuffer(
+            buffer, dtype=np.dtype(spec["dtype"]), count=int(np.prod(spec["shape"])),
+            offset=offset + spec["offset"],
+        ).reshape(spec["shape"])
+    return arrays
+
+
+def write_artifact(path, forest, scaler, encoders, schema, source_hashes):
+    """Write ``forest`` (unfolded) and the preprocessing tables to ``path``.
+
+    ``source_hashes`` are the manifest hashes of the pickles the artifact
+    was built from, so a stale artifact is detected after a retrain.
+    """
+    index = _index_dtype(forest.n_nodes)
+    with_mean = bool(getattr(scaler, "with_mean", True))
+    with_std = bool(getattr(scaler, "with_std", True))
+    arrays = {
+        "feature": forest.feature.astype(_feature_dtype(forest.n_features)),
+        "threshold": _quantize_thresholds(forest.threshold),
+        "left": forest.left.astype(index),
+        "right": forest.right.astype(index),
+        "missing_left": forest.missing_left.astype(bool),
+        "value": forest.value.astype(np.float64),
+        "roots": forest.roots.astype(index),
+        "classes": np.asarray(forest.classes_),
+        "scaler_mean": np.asarray(scaler.mean_ if with_mean else np.zeros(forest.n_features),
+                                  dtype=np.float64),
+        "scaler_scale": np.asarray(scaler.scale_ if with_std else np.ones(forest.n_features),
+                                   dtype=np.float64),
+    }
+    table, data = pack_arrays(arrays)
+    names = getattr(scaler, "feature_names_in_", None)
+    header = {
+        "schema": schema,
+        "source_sha256": source_hashes,
+        "forest": {"max_depth": forest.max_depth, "n_features": forest.n_features},
+        "scaler": {"with_mean": with_mean, "with_std": with_std,
+                   "feature_names": None if names is None else [str(n) for n in names]},
+        "encoders": {col: [str(c) for c in enc.classes_] for col, enc in encoders.items()},
+        "arrays": table,
+    }
+    header_bytes = json.dumps(header, sort_keys=True).encode()
+    # Pad the header so the data section starts aligned
+    header_bytes += b" " * (-(_PREAMBLE.size + len(header_bytes)) % ALIGN)
+
+    with open(path + ".tmp", "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    return header
+
+
+class Artifact:
+    """An opened artifact: its header plus the arrays, mapped read-only."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buffer) < _PREAMBLE.size:
+            raise ArtifactError(f"{path} is too short to be a model artifact")
+        magic, version, header_size = _PREAMBLE.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ArtifactError(f"{path} is not a model artifact")
+        if version != FORMAT_VERSION:
+            raise ArtifactError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+        start = _PREAMBLE.size
+        self.header = json.loads(bytes(self.buffer[start:start + header_size]))
+        self.arrays = unpack_arrays(self.buffer, self.header["arrays"], start + header_size)
+
+    @property
+    def schema(self):
+        return self.header["schema"]
+
+    @property
+    def source_hashes(self):
+        return self.header["source_sha256"]
+
+    def forest(self):
+        """The unfolded flat forest, on the mapped arrays."""
+        meta = self.header["forest"]
+        return FlatForest(
+            **{name: self.arrays[name] for name in FlatForest.ARRAYS},
+            classes=self.arrays["classes"], max_depth=meta["max_depth"],
+            n_features=meta["n_features"],
+        )
+
+    def scaler(self):
+        meta = self.header["scaler"]
+        return ScalerTable(self.arrays["scaler_mean"], self.arrays["scaler_scale"],
+                           with_mean=meta["with_mean"], with_std=meta["with_std"],
+                           feature_names=meta["feature_names"])
+
+    def encoders(self):
+        return {col: EncoderTable(classes) for col, classes in self.header["encoders"].items()}
+
+
+def build(directory):
+    """Compile the pickled bundle in ``directory`` into its artifact.
+
+    Updates the manifest to reference the new file; returns the manifest.
+    """
+    from .bundle import MANIFEST_COMPUTED, load_bundle, write_manifest, read_manifest
+    bundle = load_bundle(directory, artifact=False)
+    manifest = read_manifest(directory) or {}
+    extra = {k: v for k, v in manifest.items() if k not in MANIFEST_COMPUTED}
+    write_artifact(os.path.join(directory, ARTIFACT_FILE), bundle.forest, bundle.scaler,
+                   bundle.encoders, bundle.schema, bundle.hashes)
+    return write_manifest(directory, extra)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect the memory-mapped model artifact.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="compile the pickled bundle into " + ARTIFACT_FILE)
+    build_cmd.add_argument("--check", metavar="CSV",
+                           help="verify the artifact's predictions against the pickles on this CSV")
+    info = sub.add_parser("info", help="print the artifact's header")
+    for cmd in (build_cmd, info):
+        cmd.add_argument("--bundle-dir", default=None)
+    args = parser.parse_args(argv)
+
+    from .bundle import DEFAULT_DIR, load_bundle
+    directory = args.bundle_dir or DEFAULT_DIR
+    path = os.path.join(directory, ARTIFACT_FILE)
+    if args.command == "info":
+        header = dict(Artifact(path).header)
+        header["schema"] = header["schema"].get("id")
+        print(json.dumps(header, indent=2, sort_keys=True))
+        return 0
+
+    manifest = build(directory)
+    print(f"Wrote {path} ({os.path.getsize(path)} bytes) for bundle {manifest['version']}")
+    if args.check:
+        from .features import encode_frame, scale_matrix
+        from .forest import _read_check_frame
+        pickled = load_bundle(directory, artifact=False)
+        mapped = load_bundle(directory)
+        X = encode_frame(_read_check_frame(args.check), pickled.encoders)
+        expected = pickled.model.predict_proba(scale_matrix(X, pickled.scaler))
+        got = [mapped.forest.predict_proba(scale_matrix(X, mapped.scaler))]
+        if mapped.folded is not None:
+            got.append(mapped.folded.predict_proba(X))
+        if not all(np.array_equal(proba, expected) for proba in got):
+            print("MISMATCH: artifact differs from the pickled model", file=sys.stderr)
+            return 1
+        print(f"Bit-for-bit identical to the pickled model on {len(X)} rows of {args.check}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
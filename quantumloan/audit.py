@@ -0,0 +1,466 @@
+"""Append-only audit log of every scoring decision.
+
+Usage::
+
+    python -m quantumloan.audit show --start 2026-10-01 --end 2026-10-02
+    python -m quantumloan.audit rescore --bundle-dir candidate/ --output changed.csv
+
+``AuditLog.record`` only puts the decision on an in-memory queue; a
+background thread collects queued decisions and appends them as one block
+every ``flush_interval`` seconds or ``flush_rows`` rows, so the scoring
+path never waits on the disk. ``record`` checks its input on the caller's
+thread and raises ``ValueError`` for a malformed decision. The queue is
+bounded: when the writer falls that far behind, or has stopped, ``record``
+drops the decision rather than stall the caller, and counts it in
+``dropped_rows`` and ``quantumloan_audit_dropped_rows``.
+
+Segment files (``*.qla``) start with an 8-byte magic and hold a sequence of
+blocks. Each block is a small JSON header (row count, time range and the
+tables of bundle versions, sources and fallback reasons its rows index
+into) followed by the columns: timestamp, encoded features, decision,
+confidence and approval probability, laid out like the model artifact's
+arrays. A writer starts a new segment once the current one reaches
+``segment_bytes`` or ``segment_seconds``. Readers map the segments, skip
+blocks outside the requested time range by their headers alone and stop at
+a block cut short by a crash.
+"""
+import argparse
+import atexit
+import datetime
+import glob
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+from .artifact import pack_arrays, unpack_arrays
+from .features import FEATURE_COLUMNS
+from .metrics import AUDIT_DROPPED, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+AUDIT_DIR = os.environ.get(
+    "QUANTUMLOAN_AUDIT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "audit_log"),
+)
+# Keep the audit log; QUANTUMLOAN_AUDIT=0 disables it
+AUDIT_ENABLED = os.environ.get("QUANTUMLOAN_AUDIT", "1") != "0"
+FLUSH_ROWS = 4096
+FLUSH_INTERVAL = float(os.environ.get("QUANTUMLOAN_AUDIT_FLUSH_INTERVAL", "1.0"))
+SEGMENT_BYTES = 64 * 1024 * 1024
+SEGMENT_SECONDS = 24 * 3600
+# Queued record() calls before decisions are dropped
+MAX_PENDING = 100_000
+
+SEGMENT_MAGIC = b"QLAUDIT1"
+SEGMENT_SUFFIX = ".qla"
+# Block magic, header length, data length
+_BLOCK = struct.Struct("<4sIQ")
+_BLOCK_MAGIC = b"QLAB"
+_ALIGN = 8
+
+
+def _codes(values, table):
+    # Index of each value in table, appending unseen ones
+    codes = []
+    for value in values:
+        if value not in table:
+            table.append(value)
+        codes.append(table.index(value))
+    return codes
+
+
+class _Segment:
+    """The segment file a writer is currently appending to."""
+
+    def __init__(self, directory, sequence):
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        self.path = os.path.join(directory, f"{stamp}-{os.getpid()}-{sequence:04d}{SEGMENT_SUFFIX}")
+        self.file = open(self.path, "xb")
+        self.file.write(SEGMENT_MAGIC)
+        self.size = len(SEGMENT_MAGIC)
+        self.opened_at = time.monotonic()
+
+    def append(self, block, fsync):
+        self.file.write(block)
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+        self.size += len(block)
+
+    def close(self):
+        self.file.close()
+
+
+def encode_block(entries):
+    """One block of bytes for a list of queued ``(ts, X, approved, ...)`` entries."""
+    versions, sources, reasons = [], [], []
+    sizes = [len(e[1]) for e in entries]
+
+    def column(k, dtype):
+        # Scalars and arrays both broadcast to their entry's rows
+        return np.concatenate([np.broadcast_to(np.asarray(e[k], dtype=dtype), n)
+                               for e, n in zip(entries, sizes)])
+
+    ts = np.repeat(np.array([e[0] for e in entries]), sizes)
+    arrays = {
+        "ts": ts,
+        "X": np.vstack([e[1] for e in entries]),
+        "approved": column(2, bool),
+        "confidence": column(3, np.float64),
+        "approval_probability": column(4, np.float64),
+        "version": np.repeat(np.array(_codes([e[5] for e in entries], versions), dtype=np.uint16),
+                             sizes),
+        "source": np.repeat(np.array(_codes([e[6] for e in entries], sources), dtype=np.uint8),
+                            sizes),
+        "fallback": np.repeat(np.array(_codes([e[7] for e in entries], reasons), dtype=np.uint8),
+                              sizes),
+    }
+    table, data = pack_arrays(arrays, _ALIGN)
+    header = json.dumps({
+        "rows": len(ts), "ts_min": float(ts.min()), "ts_max": float(ts.max()),
+        "features": FEATURE_COLUMNS, "versions": versions, "sources": sources,
+        "reasons": reasons, "arrays": table,
+    }).encode()
+    header += b" " * (-(_BLOCK.size + len(header)) % _ALIGN)
+    return _BLOCK.pack(_BLOCK_MAGIC, len(header), len(data)) + header + data
+
+
+class AuditLog:
+    """Queue of decisions drained into segment files by a background thread."""
+
+    def __init__(self, directory=AUDIT_DIR, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 segment_bytes=SEGMENT_BYTES, segment_seconds=SEGMENT_SECONDS,
+                 max_pending=MAX_PENDING, fsync=True):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.fsync = fsync
+        self.rows_written = 0
+        self.blocks_written = 0
+        self.write_errors = 0
+        self.dropped_rows = 0
+        self._queue = queue.Queue(max_pending)
+        self._segment = None
+        self._sequence = 0
+        self._thread = threading.Thread(target=self._run, name="quantumloan-audit", daemon=True)
+        self._thread.start()
+
+    def record(self, X, approved, confidence, approval_probability=None, version="",
+               source="app", fallback=""):
+        """Queue one decision per row of the encoded matrix ``X``.
+
+        ``approved`` and ``confidence`` are what the caller showed;
+        ``approval_probability`` is the model's (NaN when it was not used),
+        ``fallback`` the reason a random decision replaced the model's.
+        Each of the three is a scalar or has one value per row.
+        """
+        # Only a copy and shape checks here; columns are built on the writer thread
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        if X.ndim != 2 or X.shape[1] != len(FEATURE_COLUMNS):
+            raise ValueError(f"Audit record has shape {X.shape}, expected "
+                             f"(rows, {len(FEATURE_COLUMNS)})")
+        if approval_probability is None:
+            approval_probability = np.nan
+        for name, value in (("approved", approved), ("confidence", confidence),
+                            ("approval_probability", approval_probability)):
+            if np.ndim(value) > 1 or (np.ndim(value) == 1 and len(value) != len(X)):
+                raise ValueError(f"Audit record {name} has shape {np.shape(value)} for "
+                                 f"{len(X)} rows")
+        entry = (time.time(), X, approved, confidence, approval_probability,
+                 version, source, fallback)
+        if not self._thread.is_alive():
+            self._drop(len(X))
+            return
+        try:
+            self._queue.put(entry, block=False)
+        except queue.Full:
+            self._drop(len(X))
+
+    def _drop(self, n_rows):
+        self.dropped_rows += n_rows
+        AUDIT_DROPPED.inc(n_rows)
+
+    def record_result(self, X, result, version, source):
+        """Queue the rows of a ``ScoreResult`` for encoded matrix ``X``."""
+        self.record(X, result.approved, result.confidence, result.approval_probability,
+                    version=version, source=source)
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is on disk.
+
+        Returns ``False`` on timeout or when the writer has stopped.
+        """
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Write what is queued and stop the writer."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _run(self):
+        pending, n_pending, deadline = [], 0, None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if isinstance(item, tuple) and item:
+                pending.append(item)
+                n_pending += len(item[1])
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if n_pending < self.flush_rows:
+                    continue
+            # Flush on size, on the deadline, or for flush()/close()
+            if pending and self._write(pending):
+                pending, n_pending, deadline = [], 0, None
+            elif pending:
+                # Keep the rows and retry after another interval
+                deadline = time.monotonic() + self.flush_interval
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                if self._segment is not None:
+                    self._segment.close()
+                return
+
+    def _write(self, entries):
+        start = time.perf_counter()
+        try:
+            block = encode_block(entries)
+        except Exception:
+            # Retrying would fail the same way; drop the block, keep the writer
+            logger.exception("Audit log block of %d decisions could not be encoded; dropped",
+                             len(entries))
+            self.write_errors += 1
+            self._drop(sum(len(e[1]) for e in entries))
+            return True
+        try:
+            segment = self._segment
+            if segment is not None and (segment.size >= self.segment_bytes or
+                                        time.monotonic() - segment.opened_at >= self.segment_seconds):
+                segment.close()
+                segment = None
+            if segment is None:
+                self._sequence += 1
+                segment = self._segment = _Segment(self.directory, self._sequence)
+            segment.append(block, self.fsync)
+        except Exception:
+            logger.exception("Audit log write to %s failed", self.directory)
+            self.write_errors += 1
+            # A half-written block ends its segment for readers; start a new one
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            return False
+        self.rows_written += sum(len(e[1]) for e in entries)
+        self.blocks_written += 1
+        STAGE_SECONDS.observe(time.perf_counter() - start, source="audit", stage="flush")
+        return True
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_audit_log():
+    """The process-wide ``AuditLog`` in ``AUDIT_DIR``, or ``None`` when disabled."""
+    global _log
+    if not AUDIT_ENABLED:
+        return None
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = AuditLog(AUDIT_DIR)
+                atexit.register(_log.close)
+    return _log
+
+
+# Reading
+
+class AuditRecords:
+    """Decisions read back from the log, one array per column, oldest first."""
+
+    COLUMNS = ("ts", "X", "approved", "confidence", "approval_probability",
+               "version", "source", "fallback")
+
+    def __init__(self, **columns):
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.ts)
+
+    def select(self, mask):
+        return AuditRecords(**{name: getattr(self, name)[mask] for name in self.COLUMNS})
+
+    def to_frame(self):
+        """A DataFrame with a UTC ``time`` column and one column per feature."""
+        import pandas as pd
+
+        frame = pd.DataFrame(self.X, columns=FEATURE_COLUMNS)
+        frame.insert(0, "time", pd.to_datetime(self.ts, unit="s", utc=True))
+        for name in self.COLUMNS[2:]:
+            frame[name] = getattr(self, name)
+        return frame
+
+
+def segment_paths(directory=AUDIT_DIR):
+    return sorted(glob.glob(os.path.join(directory, "*" + SEGMENT_SUFFIX)))
+
+
+def iter_blocks(path, start=None, end=None):
+    """``(header, arrays)`` of each block in ``path`` overlapping ``[start, end)``.
+
+    Arrays are copies, so they stay valid after the segment is unmapped.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= len(SEGMENT_MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if buffer[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                raise ValueError(f"{path} is not an audit log segment")
+            offset = len(SEGMENT_MAGIC)
+            while offset + _BLOCK.size <= len(buffer):
+                magic, header_size, data_size = _BLOCK.unpack_from(buffer, offset)
+                data = offset + _BLOCK.size + header_size
+                if magic != _BLOCK_MAGIC or data + data_size > len(buffer):
+                    logger.warning("Audit segment %s ends in an incomplete block", path)
+                    return
+                header = json.loads(bytes(buffer[offset + _BLOCK.size:data]))
+                offset = data + data_size
+                if (start is not None and header["ts_max"] < start) or \
+                        (end is not None and header["ts_min"] >= end):
+                    continue
+                # Copy out of the mapping so it can be closed
+                yield header, {name: array.copy() for name, array
+                               in unpack_arrays(buffer, header["arrays"], data).items()}
+
+
+def read_log(directory=AUDIT_DIR, start=None, end=None):
+    """Every decision logged in ``[start, end)`` (Unix seconds; ``None`` is open)."""
+    parts = {name: [] for name in AuditRecords.COLUMNS}
+    for path in segment_paths(directory):
+        for header, arrays in iter_blocks(path, start, end):
+            if header["features"] != FEATURE_COLUMNS:
+                raise ValueError(f"{path} was logged with features {header['features']}")
+            for name in ("ts", "X", "approved", "confidence", "approval_probability"):
+                parts[name].append(arrays[name])
+            for name, table in (("version", "versions"), ("source", "sources"),
+                                ("fallback", "reasons")):
+                parts[name].append(np.array(header[table], dtype=object)[arrays[name]])
+    if not parts["ts"]:
+        empty = {name: np.empty(0, dtype=object) for name in AuditRecords.COLUMNS}
+        empty.update(ts=np.empty(0), X=np.empty((0, len(FEATURE_COLUMNS))),
+                     approved=np.empty(0, dtype=bool), confidence=np.empty(0),
+                     approval_probability=np.empty(0))
+        return AuditRecords(**empty)
+    records = AuditRecords(**{name: np.concatenate(values) for name, values in parts.items()})
+    keep = np.ones(len(records), dtype=bool)
+    if start is not None:
+        keep &= records.ts >= start
+    if end is not None:
+        keep &= records.ts < end
+    # Segments of several processes interleave in time
+    order = np.flatnonzero(keep)[np.argsort(records.ts[keep], kind="stable")]
+    return records.select(order)
+
+
+def rescore(records, bundle):
+    """Score logged decisions again with ``bundle``.
+
+    Returns ``(scored, result)``: the indices of the records that had
+    features to score (random fallbacks without a model have none) and the
+    ``ScoreResult`` for those rows.
+    """
+    from .inference import score_matrix
+
+    scored = np.flatnonzero(~np.isnan(records.X).all(axis=1))
+    return scored, score_matrix(bundle, records.X[scored])
+
+
+def _parse_time(value):
+    # ISO 8601 (UTC unless it has an offset) or Unix seconds
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+
+
+def _counts(values):
+    names, counts = np.unique(values.astype(str), return_counts=True)
+    return ", ".join(f"{name or 'none'}: {count}" for name, count in zip(names, counts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or replay the decision audit log.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="summarise the decisions in a time range")
+    replay = sub.add_parser("rescore", help="score logged decisions again with another bundle")
+    replay.add_argument("--bundle-dir", default=None, help="bundle to score with (default: current)")
+    replay.add_argument("--output", help="CSV of the decisions that changed")
+    for cmd in (show, replay):
+        cmd.add_argument("--audit-dir", default=AUDIT_DIR)
+        cmd.add_argument("--start", type=_parse_time, help="ISO time or Unix seconds (inclusive)")
+        cmd.add_argument("--end", type=_parse_time, help="ISO time or Unix seconds (exclusive)")
+    args = parser.parse_args(argv)
+
+    read_start = time.perf_counter()
+    records = read_log(args.audit_dir, args.start, args.end)
+    read_seconds = time.perf_counter() - read_start
+    print(f"{len(records)} decisions read in {read_seconds:.3f} s")
+    if not len(records):
+        return 0
+    if args.command == "show":
+        first, last = (datetime.datetime.fromtimestamp(t, datetime.timezone.utc).isoformat()
+                       for t in (records.ts[0], records.ts[-1]))
+        print(f"from {first} to {last}")
+        print(f"approved: {records.approved.mean():.1%}")
+        print(f"bundle versions: {_counts(records.version)}")
+        print(f"sources: {_counts(records.source)}")
+        print(f"random fallbacks: {_counts(records.fallback)}")
+        return 0
+
+    from .bundle import get_bundle
+    bundle = get_bundle(args.bundle_dir)
+    scored, result = rescore(records, bundle)
+    was = records.approved[scored]
+    changed = was != result.approved
+    print(f"rescored {len(scored)} with bundle {bundle.version}: {changed.sum()} decisions change "
+          f"({(was & ~result.approved).sum()} approvals lost, "
+          f"{(~was & result.approved).sum()} gained)")
+    if args.output:
+        frame = records.select(scored[changed]).to_frame()
+        frame["new_approved"] = result.approved[changed]
+        frame["new_approval_probability"] = result.approval_probability[changed]
+        frame["new_version"] = bundle.version
+        frame.to_csv(args.output, index=False)
+        print(f"wrote {len(frame)} changed decisions to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
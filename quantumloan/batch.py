@@ -0,0 +1,245 @@
+"""Batch scoring of applicant CSVs in bounded-memory chunks.
+
+Usage::
+
+    python -m quantumloan.batch applicants.csv scored.csv --chunksize 100000
+
+The input has the same columns as ``Loan_approvals.csv`` (``Loan_Status``
+is optional). Each chunk is encoded and scaled in one vectorized pass, scored
+with a single ``predict_proba`` call and appended to the output, so memory
+stays flat however large the input is.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from .audit import get_audit_log
+from .bundle import get_bundle
+from .counterfactual import ACTIONS
+from .dataset import load_dataset
+from .drift import get_drift_monitor
+from .explain import explain_matrix
+from .features import (
+    CATEGORICAL_COLUMNS, FEATURE_COLUMNS, ID_COLUMN, TARGET_COLUMN, encode_frame, scale_matrix,
+)
+from .inference import ScoreResult
+from .metrics import STAGE_SECONDS, count_outcomes, dump
+from .parallel import BACKENDS, predict_proba_parallel
+from .shadow import ShadowScorer, format_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNKSIZE = 100_000
+CONTRIBUTION_DECIMALS = 6
+
+
+def read_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Iterate over the feature (and id) columns of ``path`` in chunks."""
+    wanted = set(FEATURE_COLUMNS + [ID_COLUMN])
+    return pd.read_csv(
+        path,
+        chunksize=chunksize,
+        usecols=lambda c: c in wanted,
+        # Keep categorical codes such as Dependents="0" as strings
+        dtype={col: str for col in CATEGORICAL_COLUMNS},
+    )
+
+
+def counterfactual_columns(options):
+    """Columns for the cheapest option of each row (NaN where there is none)."""
+    columns = {f"counterfactual_{feature}": np.full(len(options), np.nan) for feature in ACTIONS}
+    cost, proba = np.full(len(options), np.nan), np.full(len(options), np.nan)
+    for i, found in enumerate(options):
+        if found:
+            for feature, value in found[0]["changes"].items():
+                columns[f"counterfactual_{feature}"][i] = value
+            cost[i], proba[i] = found[0]["cost"], found[0]["approval_probability"]
+    columns["counterfactual_cost"] = cost
+    columns["counterfactual_probability"] = proba
+    return columns
+
+
+def score_encoded(X, bundle, ids=None, n_jobs=1, backend="threads", index=None, explain=False,
+                  counterfactuals=False, shadow=None):
+    """Score an encoded matrix; returns id, approval probability and predicted label.
+
+    With ``explain`` a ``contribution_<feature>`` column per feature is added
+    (see ``quantumloan.explain``); with ``counterfactuals`` the new values of
+    the cheapest change that would approve a rejected row (see
+    ``quantumloan.counterfactual``). Every decision is queued for the audit
+    log (see ``quantumloan.audit``); rows and scores also feed the drift
+    monitor (see ``quantumloan.drift``) and, when given, the ``shadow``
+    scorer's challengers (see ``quantumloan.shadow``).
+    """
+    encoded = X
+    if explain:
+        with STAGE_SECONDS.time(source="batch", stage="explain"):
+            explanation = explain_matrix(bundle, X)
+    if counterfactuals:
+        with STAGE_SECONDS.time(source="batch", stage="search"):
+            options = bundle.counterfactuals.search(X)
+    with STAGE_SECONDS.time(source="batch", stage="scale"):
+        X = scale_matrix(X, bundle.scaler)
+    with STAGE_SECONDS.time(source="batch", stage="predict"):
+        proba = predict_proba_parallel(X, bundle, n_jobs=n_jobs, backend=backend)
+    result = ScoreResult(bundle, proba)
+    count_outcomes("batch", result.approved)
+    monitor = get_drift_monitor(bundle)
+    if monitor is not None:
+        with STAGE_SECONDS.time(source="batch", stage="drift"):
+            monitor.update(encoded, result.approval_probability)
+    audit_log = get_audit_log()
+    if audit_log is not None:
+        audit_log.record_result(encoded, result, bundle.version, "batch")
+    if shadow is not None:
+        # Waits only when the challengers are a whole queue behind
+        shadow.submit_result(bundle, encoded, result, block=True)
+    out = pd.DataFrame({
+        "approval_probability": result.approval_probability,
+        TARGET_COLUMN: result.label_names,
+    }, index=index)
+    if explain:
+        # Rounded: 1e-6 of probability is noise, and full-precision floats
+        # would make CSV formatting the slowest stage
+        for name, values in explanation.columns().items():
+            out[name] = values.round(CONTRIBUTION_DECIMALS)
+    if counterfactuals:
+        for name, values in counterfactual_columns(options).items():
+            out[name] = values
+    if ids is not None:
+        out.insert(0, ID_COLUMN, ids)
+    return out
+
+
+def score_frame(df, bundle, n_jobs=1, backend="threads", explain=False, counterfactuals=False,
+                shadow=None):
+    """Score one chunk; returns id, approval probability and predicted label."""
+    ids = df[ID_COLUMN].to_numpy() if ID_COLUMN in df.columns else None
+    with STAGE_SECONDS.time(source="batch", stage="encode"):
+        X = encode_frame(df, bundle.encoders)
+    return score_encoded(X, bundle, ids=ids,
+                         n_jobs=n_jobs, backend=backend, index=df.index, explain=explain,
+                         counterfactuals=counterfactuals, shadow=shadow)
+
+
+def _cached_chunks(path, bundle, chunksize):
+    # Encoded slices of the columnar cache instead of parsed CSV chunks
+    dataset = load_dataset(path)
+    has_ids = ID_COLUMN in dataset.columns
+    for start in range(0, len(dataset), chunksize):
+        rows = slice(start, start + chunksize)
+        with STAGE_SECONDS.time(source="batch", stage="encode"):
+            X = dataset.encoded(bundle.encoders, rows)
+        yield X, dataset.ids(rows) if has_ids else None
+
+
+def score_csv(input_path, output_path, bundle=None, chunksize=DEFAULT_CHUNKSIZE,
+              n_jobs=1, backend="threads", use_cache=False, explain=False,
+              counterfactuals=False, challenger_dirs=None):
+    """Stream ``input_path`` through the model into ``output_path``.
+
+    With ``use_cache`` the input is read through its columnar cache (see
+    ``quantumloan.dataset``), built on first use. With ``explain`` each row
+    also gets its per-feature contributions, with ``counterfactuals`` the
+    cheapest change that would approve it. Each bundle in
+    ``challenger_dirs`` scores the same encoded chunks on a background
+    thread and is compared with ``bundle`` (see ``quantumloan.shadow``).
+    Returns a stats dict with row count, wall time and rows/second.
+    """
+    bundle = bundle or get_bundle()
+    # A chunk or two of lead over the challengers bounds the memory held
+    shadow = (ShadowScorer(challenger_dirs, batch_rows=chunksize, max_pending=2)
+              if challenger_dirs else None)
+    start = time.perf_counter()
+    rows = 0
+    if use_cache:
+        chunks = (score_encoded(X, bundle, ids=ids, n_jobs=n_jobs, backend=backend,
+                                explain=explain, counterfactuals=counterfactuals, shadow=shadow)
+                  for X, ids in _cached_chunks(input_path, bundle, chunksize))
+    else:
+        chunks = (score_frame(chunk, bundle, n_jobs=n_jobs, backend=backend, explain=explain,
+                              counterfactuals=counterfactuals, shadow=shadow)
+                  for chunk in read_chunks(input_path, chunksize))
+    with open(output_path, "w", newline="") as out:
+        for i, scored in enumerate(chunks):
+            scored.to_csv(out, header=(i == 0), index=False)
+            rows += len(scored)
+            elapsed = time.perf_counter() - start
+            logger.info("%d rows scored (%.0f rows/s)", rows, rows / elapsed)
+    elapsed = time.perf_counter() - start
+    if shadow is not None:
+        shadow.close()
+    monitor = get_drift_monitor(bundle)
+    return {
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed > 0 else 0.0,
+        "bundle_version": bundle.version,
+        "drift": monitor.report() if monitor is not None else None,
+        "shadow": shadow.stats() if shadow is not None else None,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Score an applicant CSV in chunks.")
+    parser.add_argument("input", help="CSV with the Loan_approvals.csv feature columns")
+    parser.add_argument("output", help="where to write the scored CSV")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="rows per chunk (default: %(default)s)")
+    parser.add_argument("-j", "--n-jobs", type=int, default=1,
+                        help="worker count, -1 for all cores (default: %(default)s)")
+    parser.add_argument("--backend", choices=BACKENDS, default="threads",
+                        help="parallel backend (default: %(default)s)")
+    parser.add_argument("--bundle-dir", default=None,
+                        help="model bundle directory (default: repository root)")
+    parser.add_argument("--cache", action="store_true",
+                        help="read the input through its columnar cache (<input>.cache/)")
+    parser.add_argument("--explain", action="store_true",
+                        help="add a contribution_<feature> column per feature")
+    parser.add_argument("--counterfactuals", action="store_true",
+                        help="add the cheapest approving change for rejected rows")
+    parser.add_argument("--metrics-file",
+                        help="write Prometheus-format stage timings and counts here at the end")
+    parser.add_argument("--drift-report",
+                        help="write the drift monitor's comparison with training here (JSON)")
+    parser.add_argument("--challenger", action="append", metavar="DIR",
+                        help="also score with this bundle and compare its decisions (repeatable)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every chunk")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(message)s")
+    stats = score_csv(args.input, args.output, get_bundle(args.bundle_dir),
+                      chunksize=args.chunksize, n_jobs=args.n_jobs, backend=args.backend,
+                      use_cache=args.cache, explain=args.explain,
+                      counterfactuals=args.counterfactuals, challenger_dirs=args.challenger)
+    print(
+        f"Scored {stats['rows']} rows in {stats['seconds']:.2f} s "
+        f"({stats['rows_per_second']:,.0f} rows/s) with bundle {stats['bundle_version']}",
+        file=sys.stderr,
+    )
+    drift = stats["drift"]
+    if drift is not None:
+        drifted = [col for col, s in drift["overall"]["columns"].items() if s["status"] == "alert"]
+        if drifted:
+            print(f"Input drifted from the training data in: {', '.join(drifted)}", file=sys.stderr)
+        if args.drift_report:
+            with open(args.drift_report, "w") as f:
+                json.dump(drift, f, indent=2)
+    if stats["shadow"] is not None:
+        print(format_stats(stats["shadow"]), file=sys.stderr)
+    if args.metrics_file:
+        dump(args.metrics_file)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
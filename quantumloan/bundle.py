@@ -0,0 +1,364 @@
+"""Versioned model bundle shared by every caller in the process.
+
+The model, scaler and label encoders are loaded together as one bundle,
+verified against ``bundle_manifest.json`` when present, checked against the
+feature schema, and cached per directory. ``get_bundle`` re-stats the files
+at most every few seconds and swaps in a fresh bundle when they change.
+
+When the directory has an up-to-date memory-mapped artifact (see
+``quantumloan.artifact``) serving loads that instead of the pickles; the
+sklearn model is only unpickled if a caller asks for ``bundle.model``.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+from .artifact import ARTIFACT_FILE, Artifact, ArtifactError, write_artifact
+from .features import (
+    SCHEMA_FILE, build_schema, check_schema, read_schema, scale_matrix, write_schema,
+)
+from .forest import FLAT_MAX_ROWS, FlatForest, fold_scaler
+from .metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Artifact files that make up a bundle, keyed by bundle attribute
+ARTIFACTS = {
+    "model": "loan_approval.pkl",
+    "scaler": "scaler.pkl",
+    "encoders": "label_encoders.pkl",
+}
+MANIFEST = "bundle_manifest.json"
+# Manifest keys write_manifest derives from the files
+MANIFEST_COMPUTED = ("version", "sha256", "artifact")
+
+DEFAULT_DIR = os.environ.get(
+    "QUANTUMLOAN_BUNDLE_DIR",
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+)
+CHECK_INTERVAL = float(os.environ.get("QUANTUMLOAN_BUNDLE_CHECK_INTERVAL", "2.0"))
+# Compile the scaler into the forest thresholds; QUANTUMLOAN_FOLD_SCALER=0 disables
+FOLD_SCALER = os.environ.get("QUANTUMLOAN_FOLD_SCALER", "1") != "0"
+# Load the memory-mapped artifact when present; QUANTUMLOAN_ARTIFACT=0 disables
+USE_ARTIFACT = os.environ.get("QUANTUMLOAN_ARTIFACT", "1") != "0"
+
+
+class BundleIntegrityError(Exception):
+    """Raised when artifact hashes do not match the bundle manifest."""
+
+
+class ModelBundle:
+    """The model, scaler and encoders loaded as one versioned unit.
+
+    Bundles loaded from the artifact get ``forest`` directly and a
+    ``model_loader`` that unpickles the sklearn model on first access.
+    """
+
+    def __init__(self, model, scaler, encoders, schema, directory, hashes, load_seconds,
+                 fold=FOLD_SCALER, forest=None, model_loader=None):
+        self._model = model
+        self._model_loader = model_loader
+        self._model_lock = threading.Lock()
+        self.scaler = scaler
+        self.encoders = encoders
+        self.schema = schema
+        self.forest = forest if forest is not None else FlatForest.from_sklearn(model)
+        self.folded = fold_scaler(self.forest, scaler) if fold else None
+        self.directory = directory
+        self.hashes = hashes
+        self.version = bundle_version(hashes)
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+        self._explainer = None
+        self._counterfactuals = None
+
+    @property
+    def mapped(self):
+        """Whether the forest's arrays live on the memory-mapped artifact."""
+        return self._model_loader is not None
+
+    @property
+    def model(self):
+        """The sklearn forest (unpickled on first use for artifact bundles)."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._model_loader()
+        return self._model
+
+    def predict_proba(self, X):
+        """Class probabilities for a scaled matrix, identical to the model's.
+
+        Small batches use the flat-array forest (microseconds per row),
+        large ones sklearn's compiled tree walk.
+        """
+        if len(X) <= FLAT_MAX_ROWS:
+            return self.forest.predict_proba(X)
+        return self.model.predict_proba(X)
+
+    def predict_proba_encoded(self, X):
+        """Class probabilities for an encoded but unscaled matrix.
+
+        With a folded forest small batches skip the scaling pass entirely.
+        """
+        if self.folded is not None and len(X) <= FLAT_MAX_ROWS:
+            return self.folded.predict_proba(X)
+        return self.predict_proba(scale_matrix(X, self.scaler))
+
+    @property
+    def explainer(self):
+        """Path-contribution tables, built on first use (see ``quantumloan.explain``)."""
+        if self._explainer is None:
+            from .explain import explainer_for
+            self._explainer = explainer_for(self)
+        return self._explainer
+
+    @property
+    def counterfactuals(self):
+        """Counterfactual search tables, built on first use (see ``quantumloan.counterfactual``)."""
+        if self._counterfactuals is None:
+            from .counterfactual import CounterfactualSearch
+            self._counterfactuals = CounterfactualSearch(self)
+        return self._counterfactuals
+
+    def __repr__(self):
+        return f"ModelBundle(version={self.version!r}, directory={self.directory!r})"
+
+
+def bundle_version(hashes):
+    """Short version id derived from the artifact hashes."""
+    digest = hashlib.sha256()
+    for name in sorted(hashes):
+        digest.update(f"{name}={hashes[name]}\n".encode())
+    return digest.hexdigest()[:12]
+
+
+def _fingerprint(directory):
+    # Cheap change detection: (mtime, size) of every artifact and the manifest
+    stamp = []
+    for filename in sorted(ARTIFACTS.values()) + [ARTIFACT_FILE, SCHEMA_FILE, MANIFEST]:
+        try:
+            st = os.stat(os.path.join(directory, filename))
+            stamp.append((filename, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append((filename, None, None))
+    return tuple(stamp)
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _sha256_file(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def write_manifest(directory=DEFAULT_DIR, extra=None):
+    """Hash the artifacts in ``directory`` and write the bundle manifest.
+
+    The memory-mapped artifact is recorded separately from ``sha256``, so
+    building it does not change the bundle version. Keys of ``extra`` that
+    the manifest computes itself (version and hashes) are ignored.
+    """
+    hashes = {}
+    for filename in list(ARTIFACTS.values()) + [SCHEMA_FILE]:
+        path = os.path.join(directory, filename)
+        if filename == SCHEMA_FILE and not os.path.exists(path):
+            continue
+        hashes[filename] = _sha256_file(path)
+    manifest = {"version": bundle_version(hashes), "sha256": hashes}
+    artifact_path = os.path.join(directory, ARTIFACT_FILE)
+    if os.path.exists(artifact_path):
+        manifest["artifact"] = {"file": ARTIFACT_FILE, "sha256": _sha256_file(artifact_path)}
+    if extra:
+        manifest.update({k: v for k, v in extra.items() if k not in MANIFEST_COMPUTED})
+    tmp_path = os.path.join(directory, MANIFEST + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+    return manifest
+
+
+def save_bundle(directory, model, scaler, encoders, extra=None):
+    """Write a complete bundle to ``directory`` and return its manifest.
+
+    Each file is written to a temporary name and renamed into place, and
+    the manifest goes last, so a process hot-reloading the directory sees
+    either the old bundle or the new one, never a mix.
+    """
+    import joblib
+
+    os.makedirs(directory, exist_ok=True)
+    for attr, obj in (("model", model), ("scaler", scaler), ("encoders", encoders)):
+        path = os.path.join(directory, ARTIFACTS[attr])
+        joblib.dump(obj, path + ".tmp")
+        os.replace(path + ".tmp", path)
+    schema = build_schema(encoders)
+    schema_path = write_schema(directory, schema)
+    check_schema(read_schema(directory), model, scaler, encoders)
+    hashes = {filename: _sha256_file(os.path.join(directory, filename))
+              for filename in list(ARTIFACTS.values()) + [SCHEMA_FILE]}
+    write_artifact(os.path.join(directory, ARTIFACT_FILE), FlatForest.from_sklearn(model),
+                   scaler, encoders, schema, hashes)
+    logger.info("Wrote bundle artifacts, %s and %s", schema_path, ARTIFACT_FILE)
+    return write_manifest(directory, extra)
+
+
+def _verify(directory, hashes, manifest):
+    if manifest is not None:
+        expected = manifest.get("sha256", {})
+        bad = [name for name, value in hashes.items() if expected.get(name) != value]
+        if bad:
+            raise BundleIntegrityError(
+                f"Hash mismatch for {', '.join(sorted(bad))} in {directory}"
+            )
+
+
+def _unpickler(path, expected):
+    # Deferred ``bundle.model`` for artifact bundles, verified like a full load
+    def load():
+        import joblib
+
+        with open(path, "rb") as f:
+            data = f.read()
+        if expected is not None and hashlib.sha256(data).hexdigest() != expected:
+            raise BundleIntegrityError(f"Hash mismatch for {os.path.basename(path)}")
+        return joblib.load(io.BytesIO(data))
+    return load
+
+
+def _load_artifact(directory, manifest, start):
+    """Bundle from the memory-mapped artifact, or ``None`` if it is missing or stale."""
+    entry = (manifest or {}).get("artifact")
+    path = os.path.join(directory, ARTIFACT_FILE)
+    if entry is None or not os.path.exists(path):
+        return None
+    try:
+        artifact = Artifact(path)
+    except ArtifactError as e:
+        logger.warning("Ignoring %s: %s", path, e)
+        return None
+    if hashlib.sha256(artifact.buffer).hexdigest() != entry["sha256"]:
+        raise BundleIntegrityError(f"Hash mismatch for {ARTIFACT_FILE} in {directory}")
+    hashes = artifact.source_hashes
+    if hashes != manifest.get("sha256"):
+        logger.warning("%s was built from other artifacts than the manifest lists; "
+                       "loading the pickles instead", path)
+        return None
+
+    scaler, encoders = artifact.scaler(), artifact.encoders()
+    check_schema(artifact.schema, None, scaler, encoders)
+    model_file = ARTIFACTS["model"]
+    return ModelBundle(
+        None, scaler, encoders, artifact.schema, directory=directory, hashes=hashes,
+        load_seconds=time.perf_counter() - start, forest=artifact.forest(),
+        model_loader=_unpickler(os.path.join(directory, model_file), hashes.get(model_file)),
+    )
+
+
+def load_bundle(directory=DEFAULT_DIR, artifact=USE_ARTIFACT):
+    """Load and verify a bundle from ``directory`` without caching.
+
+    With ``artifact`` an up-to-date memory-mapped artifact is preferred
+    over the pickles.
+    """
+    start = time.perf_counter()
+    manifest = read_manifest(directory)
+    if artifact:
+        bundle = _load_artifact(directory, manifest, start)
+        if bundle is not None:
+            return bundle
+
+    import joblib
+
+    # Read each file once: hash the bytes, then unpickle those same bytes
+    raw, hashes = {}, {}
+    for attr, filename in ARTIFACTS.items():
+        with open(os.path.join(directory, filename), "rb") as f:
+            raw[attr] = f.read()
+        hashes[filename] = hashlib.sha256(raw[attr]).hexdigest()
+    schema_path = os.path.join(directory, SCHEMA_FILE)
+    schema_bytes = None
+    if os.path.exists(schema_path):
+        with open(schema_path, "rb") as f:
+            schema_bytes = f.read()
+        hashes[SCHEMA_FILE] = hashlib.sha256(schema_bytes).hexdigest()
+    _verify(directory, hashes, manifest)
+
+    objects = {attr: joblib.load(io.BytesIO(data)) for attr, data in raw.items()}
+
+    # Refuse artifacts that disagree with the stored feature schema. Bundles
+    # without a schema file are checked against one derived from the encoders.
+    if schema_bytes is not None:
+        schema = json.loads(schema_bytes)
+    else:
+        schema = build_schema(objects["encoders"])
+    check_schema(schema, objects["model"], objects["scaler"], objects["encoders"])
+
+    return ModelBundle(
+        objects["model"], objects["scaler"], objects["encoders"], schema,
+        directory=directory, hashes=hashes,
+        load_seconds=time.perf_counter() - start,
+    )
+
+
+# Process-wide cache: one entry per bundle directory
+_lock = threading.Lock()
+_cache = {}
+_stats = {"load_count": 0, "total_load_seconds": 0.0, "last_load_seconds": None}
+
+
+def get_bundle(directory=None, check_interval=CHECK_INTERVAL):
+    """Return the cached bundle for ``directory``, reloading if files changed.
+
+    A failed reload (e.g. artifacts caught mid-write) keeps serving the
+    previous bundle; it only raises when nothing has been loaded yet.
+    """
+    directory = os.path.abspath(directory or DEFAULT_DIR)
+    now = time.monotonic()
+    entry = _cache.get(directory)
+    if entry is not None and now - entry["checked"] < check_interval:
+        return entry["bundle"]
+
+    with _lock:
+        entry = _cache.get(directory)
+        fingerprint = _fingerprint(directory)
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            entry["checked"] = now
+            return entry["bundle"]
+
+        try:
+            bundle = load_bundle(directory)
+        except Exception:
+            if entry is None:
+                raise
+            logger.exception("Reload of %s failed, keeping version %s",
+                             directory, entry["bundle"].version)
+            entry["checked"] = now
+            return entry["bundle"]
+
+        STAGE_SECONDS.observe(bundle.load_seconds, source="bundle", stage="load")
+        _stats["load_count"] += 1
+        _stats["total_load_seconds"] += bundle.load_seconds
+        _stats["last_load_seconds"] = bundle.load_seconds
+        if entry is not None:
+            logger.info("Hot-swapped bundle %s -> %s",
+                        entry["bundle"].version, bundle.version)
+        _cache[directory] = {"bundle": bundle, "fingerprint": fingerprint, "checked": now}
+        return bundle
+
+
+def bundle_stats():
+    """Load counters for confirming the bundle is loaded once per process."""
+    stats = dict(_stats)
+    stats["versions"] = {d: e["bundle"].version for d, e in _cache.items()}
+    return stats
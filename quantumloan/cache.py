@@ -0,0 +1,110 @@
+"""Process-wide LRU/TTL cache of predictions keyed by encoded features.
+
+Most form inputs are discrete and incomes move in fixed steps, so the same
+encoded feature vectors come back again and again. Entries are tagged with
+the bundle version; the first lookup under a new version drops everything.
+"""
+import collections
+import math
+import os
+import threading
+import time
+
+DEFAULT_MAXSIZE = int(os.environ.get("QUANTUMLOAN_CACHE_SIZE", "10000"))
+DEFAULT_TTL = float(os.environ.get("QUANTUMLOAN_CACHE_TTL", "3600"))
+
+
+def feature_key(row):
+    """Hashable key for one encoded feature row (NaN-safe, -0.0 == 0.0)."""
+    return tuple(None if math.isnan(v) else v + 0.0 for v in map(float, row))
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version, key):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, version, key, value):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_many(self, version, X):
+        """Look up every row of ``X``; returns (keys, values, miss indices)."""
+        keys = [feature_key(row) for row in X]
+        values = [self.get(version, key) for key in keys]
+        misses = [i for i, value in enumerate(values) if value is None]
+        return keys, values, misses
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """The cache shared by every session and request in this process."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = PredictionCache()
+    return _shared
+
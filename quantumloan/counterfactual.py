@@ -0,0 +1,200 @@
+"""Smallest changes that turn a rejection into an approval.
+
+Only the things an applicant can act on are searched: a lower loan amount,
+a different term, more co-applicant income or a repaired credit history.
+The forest's output can only change where a feature crosses one of its
+split thresholds, so each feature's candidate values are the whole-number
+values just across its (raw, scaler-folded) thresholds, nearest first. The
+cross product of those per-feature moves is scored in one batch per call,
+never one ``predict`` per candidate.
+
+Applicants that no candidate could approve are pruned before any grid is
+built: every leaf's box of feature intervals is precomputed, and the mean
+over trees of the best leaf reachable within the candidates' range bounds
+the approval probability from above.
+
+Change size is measured in training standard deviations (the scaler's
+``scale_``), summed over the changed features.
+"""
+import itertools
+
+import numpy as np
+
+from .features import FEATURE_COLUMNS, TARGET_COLUMN
+from .forest import BLOCK_ROWS, fold_scaler, scaler_arrays
+from .inference import APPROVED_LABEL, ScoreResult
+
+# Feature -> allowed direction of change
+ACTIONS = {
+    "LoanAmount": "any",
+    "Loan_Amount_Term": "any",
+    "CoapplicantIncome": "increase",
+    "Credit_History": "increase",
+}
+# Nearest candidate values kept per feature; bounds the grid per applicant
+MAX_STEPS = 6
+# Rows whose upper bound falls short of this cannot be approved; the margin
+# absorbs rounding in the mean over trees
+APPROVAL_BOUND = 0.5 - 1e-9
+# Candidate rows scored per batch in bulk searches
+MAX_BATCH_ROWS = 200_000
+
+
+class CounterfactualSearch:
+    """Per-feature candidate values for one bundle, from its split thresholds."""
+
+    def __init__(self, bundle, actions=ACTIONS, max_steps=MAX_STEPS):
+        self.bundle = bundle
+        self.max_steps = max_steps
+        # Thresholds must be in raw feature units, so fold if the bundle didn't
+        forest = bundle.folded if bundle.folded is not None else fold_scaler(bundle.forest,
+                                                                            bundle.scaler)
+        self.forest = forest
+        self.fill = forest.fill_value
+        _, self.scale = scaler_arrays(bundle.scaler, forest.n_features)
+        split = np.isfinite(forest.threshold)
+        self.columns = [FEATURE_COLUMNS.index(col) for col in actions]
+        self.directions = list(actions.values())
+        # Whole numbers just left (x <= T) and just right (x > T) of each threshold
+        self.below, self.above = [], []
+        for j in self.columns:
+            t = np.unique(forest.threshold[split & (forest.feature == j)])
+            self.below.append(np.unique(np.maximum(np.floor(t), 0.0)))
+            self.above.append(np.unique(np.floor(t) + 1.0))
+        self._leaf_boxes(bundle)
+
+    def _leaf_boxes(self, bundle):
+        # Each leaf is reached exactly when lower < x <= upper for every feature
+        forest = self.forest
+        is_leaf = ~np.isfinite(forest.threshold)
+        lower = np.full((forest.n_nodes, forest.n_features), -np.inf)
+        upper = np.full((forest.n_nodes, forest.n_features), np.inf)
+        nodes = forest.roots.astype(np.int64)
+        while len(nodes):
+            parents = nodes[~is_leaf[nodes]]
+            f, t = forest.feature[parents], forest.threshold[parents]
+            left, right = forest.left[parents], forest.right[parents]
+            lower[left], upper[left] = lower[parents], upper[parents]
+            lower[right], upper[right] = lower[parents], upper[parents]
+            upper[left, f] = np.minimum(upper[left, f], t)
+            lower[right, f] = np.maximum(lower[right, f], t)
+            nodes = np.concatenate([left, right]).astype(np.int64)
+        leaves = np.flatnonzero(is_leaf)
+        self.leaf_lower, self.leaf_upper = lower[leaves], upper[leaves]
+        approved = list(bundle.encoders[TARGET_COLUMN].classes_).index(APPROVED_LABEL)
+        self.leaf_value = forest.value[leaves, int(np.flatnonzero(forest.classes_ == approved)[0])]
+        # Leaves are stored tree by tree; first leaf of each tree
+        self.tree_start = np.searchsorted(leaves, forest.roots)
+
+    def _ranges(self, current):
+        # Per action, the interval spanned by the current value and every move
+        lo = current[:, self.columns].copy()
+        hi = lo.copy()
+        for k, direction in enumerate(self.directions):
+            if direction in ("decrease", "any") and len(self.below[k]):
+                lo[:, k] = np.minimum(lo[:, k], self.below[k][0])
+            if direction in ("increase", "any") and len(self.above[k]):
+                hi[:, k] = np.maximum(hi[:, k], self.above[k][-1])
+        return lo, hi
+
+    def upper_bound(self, X):
+        """Upper bound on the approval probability any candidate of each row reaches."""
+        current = np.where(np.isnan(X), self.fill, X)
+        lo, hi = self._ranges(current)
+        fixed = np.ones(current.shape[1], dtype=bool)
+        fixed[self.columns] = False
+        lower, upper = self.leaf_lower[:, fixed], self.leaf_upper[:, fixed]
+        a_lower, a_upper = self.leaf_lower[:, self.columns], self.leaf_upper[:, self.columns]
+        bound = np.empty(len(X))
+        for i in range(0, len(X), BLOCK_ROWS):
+            x = current[i:i + BLOCK_ROWS, np.newaxis, fixed]
+            reach = ((x > lower) & (x <= upper)).all(axis=2)
+            # Action features reach a leaf when [lo, hi] meets its interval
+            reach &= ((hi[i:i + BLOCK_ROWS, np.newaxis] > a_lower)
+                      & (lo[i:i + BLOCK_ROWS, np.newaxis] <= a_upper)).all(axis=2)
+            best = np.maximum.reduceat(np.where(reach, self.leaf_value, -np.inf),
+                                       self.tree_start, axis=1)
+            bound[i:i + BLOCK_ROWS] = best.mean(axis=1)
+        return bound
+
+    def _moves(self, k, x):
+        # Candidate values for action k from current value x, nearest first
+        moves = []
+        if self.directions[k] in ("decrease", "any"):
+            below = self.below[k]
+            moves.append(below[below < x][::-1])
+        if self.directions[k] in ("increase", "any"):
+            above = self.above[k]
+            moves.append(above[above > x])
+        moves = np.concatenate(moves) if moves else np.empty(0)
+        return moves[np.argsort(np.abs(moves - x), kind="stable")][:self.max_steps]
+
+    def grid(self, x):
+        """Candidate matrix for encoded row ``x`` and each candidate's cost."""
+        current = np.where(np.isnan(x), self.fill, x)
+        options = [np.concatenate([[x[j]], self._moves(k, current[j])])
+                   for k, j in enumerate(self.columns)]
+        combos = np.array(list(itertools.product(*options)), dtype=np.float64)
+        X = np.repeat(x[np.newaxis, :], len(combos), axis=0)
+        X[:, self.columns] = combos
+        delta = np.abs(combos - current[self.columns])
+        # A missing value kept as is (NaN == NaN) is no change
+        original = x[self.columns]
+        changed = ~((combos == original) | (np.isnan(combos) & np.isnan(original)))
+        cost = np.where(changed, delta / self.scale[self.columns], 0.0).sum(axis=1)
+        return X[1:], cost[1:], changed[1:]
+
+    def search(self, X, k=1):
+        """Up to ``k`` cheapest approving options per encoded row of ``X``.
+
+        Each option is a dict with the ``changes`` (feature -> new value),
+        their ``cost`` and the resulting ``approval_probability``. Options
+        with a superset of an earlier option's changes are skipped. Rows
+        already approved get ``[]`` as do rows no candidate flips.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        results = [[] for _ in range(len(X))]
+        rows = np.flatnonzero(~ScoreResult(self.bundle,
+                                           self.bundle.predict_proba_encoded(X)).approved)
+        # Approval needs more than half the (mean) probability
+        rows = rows[self.upper_bound(X[rows]) >= APPROVAL_BOUND]
+        pending, n_pending = [], 0
+        for i in rows:
+            pending.append((i,) + self.grid(X[i]))
+            n_pending += len(pending[-1][1])
+            if n_pending >= MAX_BATCH_ROWS:
+                self._score(pending, results, k)
+                pending, n_pending = [], 0
+        if pending:
+            self._score(pending, results, k)
+        return results
+
+    def _score(self, pending, results, k):
+        candidates = np.vstack([p[1] for p in pending])
+        scored = ScoreResult(self.bundle, self.bundle.predict_proba_encoded(candidates))
+        start = 0
+        for i, X, cost, changed in pending:
+            stop = start + len(X)
+            approved = np.flatnonzero(scored.approved[start:stop])
+            proba = scored.approval_probability[start:stop]
+            # Cheapest first; ties go to the more confident approval
+            order = approved[np.lexsort((-proba[approved], cost[approved]))]
+            chosen = []
+            for c in order:
+                if any((changed[c] >= changed[p]).all() for p in chosen):
+                    continue
+                chosen.append(c)
+                results[i].append({
+                    "changes": {FEATURE_COLUMNS[j]: float(X[c, j])
+                                for j in np.array(self.columns)[changed[c]]},
+                    "cost": float(cost[c]),
+                    "approval_probability": float(proba[c]),
+                })
+                if len(chosen) == k:
+                    break
+            start = stop
+
+
+def counterfactuals(bundle, X, k=1):
+    """``bundle``'s counterfactual search over encoded matrix ``X``."""
+    return bundle.counterfactuals.search(X, k)
@@ -0,0 +1,310 @@
+"""Columnar, memory-mappable cache of an applicant CSV.
+
+Usage::
+
+    python -m quantumloan.dataset Loan_approvals.csv
+
+The CSV is parsed once into ``<csv>.cache/``: one ``.npy`` file per column,
+with categorical columns stored as small integer codes (-1 for missing)
+against the sorted category list in ``meta.json`` and numeric columns as
+float32 wherever that is lossless. Later loads memory-map the columns
+instead of re-parsing text. The cache remembers the CSV's size, mtime and
+sha256 and rebuilds itself only when the content changes.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from .features import (
+    CATEGORICAL_COLUMNS, FEATURE_COLUMNS, ID_COLUMN, TARGET_COLUMN, SchemaMismatchError,
+)
+
+CACHE_SUFFIX = ".cache"
+META_FILE = "meta.json"
+FORMAT_VERSION = 1
+INGEST_CHUNKSIZE = 500_000
+
+_CATEGORICAL = CATEGORICAL_COLUMNS + [TARGET_COLUMN]
+
+
+def file_sha256(path, size=None):
+    """SHA-256 of the file, or of its first ``size`` bytes."""
+    digest = hashlib.sha256()
+    remaining = os.path.getsize(path) if size is None else size
+    with open(path, "rb") as f:
+        while remaining > 0:
+            block = f.read(min(remaining, 1 << 20))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _code_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _narrow(values):
+    # float32 only when every value survives the round trip
+    narrow = values.astype(np.float32)
+    if np.array_equal(narrow.astype(np.float64), values, equal_nan=True):
+        return narrow
+    return values
+
+
+class Dataset:
+    """A cached CSV: typed, memory-mapped columns plus their metadata."""
+
+    def __init__(self, directory, meta, mmap=True):
+        self.directory = directory
+        self.meta = meta
+        self.categories = meta["categories"]
+        self.sha256 = meta["source"]["sha256"]
+        self._mmap = "r" if mmap else None
+        self._columns = {}
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    @property
+    def columns(self):
+        return list(self.meta["dtypes"])
+
+    @property
+    def nbytes(self):
+        return sum(os.path.getsize(os.path.join(self.directory, f"{c}.npy")) for c in self.columns)
+
+    def column(self, name):
+        """Raw stored column: category codes or numbers."""
+        if name not in self._columns:
+            if name not in self.meta["dtypes"]:
+                raise KeyError(f"{name} is not in the cached dataset")
+            path = os.path.join(self.directory, f"{name}.npy")
+            self._columns[name] = np.load(path, mmap_mode=self._mmap)
+        return self._columns[name]
+
+    def codes(self, col, classes, rows=slice(None)):
+        """``col`` re-coded against ``classes`` as float64, NaN where missing.
+
+        Unknown categories raise ``ValueError`` naming the column, as in
+        ``features.encode_frame``.
+        """
+        stored = self.column(col)[rows]
+        index = {str(c): i for i, c in enumerate(classes)}
+        # The extra last entry maps the missing code -1 to NaN
+        lut = np.array([index.get(c, -1) for c in self.categories[col]] + [np.nan])
+        unknown = np.flatnonzero(lut[:-1] < 0)
+        if len(unknown):
+            seen = np.isin(stored, unknown)
+            if seen.any():
+                bad = sorted({self.categories[col][c] for c in np.unique(stored[seen])})[:5]
+                raise ValueError(f"Unknown {col} value(s): {', '.join(bad)}")
+        return lut[stored]
+
+    def encoded(self, encoders, rows=slice(None)):
+        """Feature matrix identical to ``encode_frame`` on the parsed CSV."""
+        missing = [c for c in FEATURE_COLUMNS if c not in self.meta["dtypes"]]
+        if missing:
+            raise SchemaMismatchError(f"Input is missing columns: {', '.join(missing)}")
+        n = len(range(len(self))[rows])
+        X = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float64)
+        for j, col in enumerate(FEATURE_COLUMNS):
+            if col in encoders:
+                X[:, j] = self.codes(col, encoders[col].classes_, rows)
+            else:
+                X[:, j] = self.column(col)[rows]
+        return X
+
+    def target(self, encoder, rows=slice(None)):
+        codes = self.codes(TARGET_COLUMN, encoder.classes_, rows)
+        if np.isnan(codes).any():
+            raise ValueError(f"{TARGET_COLUMN} is missing for some rows")
+        return codes.astype(np.int64)
+
+    def fit_encoders(self):
+        """Encoders equal to ``features.fit_encoders`` on the parsed CSV."""
+        encoders = {}
+        for col in _CATEGORICAL:
+            classes = list(self.categories[col])
+            if (self.column(col) < 0).any():
+                # fit_encoders sees missing values as the string "nan"
+                classes = sorted(set(classes) | {"nan"})
+            encoder = LabelEncoder()
+            encoder.classes_ = np.array(classes, dtype=object)
+            encoders[col] = encoder
+        return encoders
+
+    def ids(self, rows=slice(None)):
+        ids = self.column(ID_COLUMN)[rows]
+        return ids.astype(str) if ids.dtype.kind == "S" else ids
+
+    def frame(self, columns=None, rows=slice(None)):
+        """The columns as a DataFrame, categoricals as ``pd.Categorical``."""
+        data = {}
+        for col in columns or self.columns:
+            if col in self.categories:
+                data[col] = pd.Categorical.from_codes(self.column(col)[rows], self.categories[col])
+            elif col == ID_COLUMN:
+                data[col] = self.ids(rows)
+            else:
+                data[col] = np.asarray(self.column(col)[rows])
+        return pd.DataFrame(data)
+
+
+def _write_column(directory, name, parts, dtype, convert=None):
+    # Copy the per-chunk part files into one .npy, a chunk at a time
+    rows = sum(len(np.load(part, mmap_mode="r")) for part in parts)
+    path = os.path.join(directory, f"{name}.npy")
+    out = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=dtype, shape=(rows,))
+    offset = 0
+    for part in parts:
+        values = np.load(part, mmap_mode="r")
+        out[offset:offset + len(values)] = values if convert is None else convert(values)
+        offset += len(values)
+    out.flush()
+    del out
+    os.replace(path + ".tmp", path)
+    return rows
+
+
+def ingest(path, cache_dir=None, chunksize=INGEST_CHUNKSIZE):
+    """Parse the CSV at ``path`` once and write its columnar cache.
+
+    Each chunk's columns go to temporary part files as they are parsed, so
+    memory stays at about one chunk whatever the size of the CSV.
+    """
+    cache_dir = cache_dir or path + CACHE_SUFFIX
+    os.makedirs(cache_dir, exist_ok=True)
+    st = os.stat(path)
+    source = {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+              "sha256": file_sha256(path)}
+
+    parts_dir = os.path.join(cache_dir, "parts.tmp")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+    wanted = set(FEATURE_COLUMNS + _CATEGORICAL + [ID_COLUMN])
+    parts, seen = {}, {}
+    # Whether every number fits float32 exactly; the id column's widest dtype
+    narrow, id_dtype = {}, None
+    reader = pd.read_csv(path, chunksize=chunksize, usecols=lambda c: c in wanted,
+                         dtype={c: str for c in _CATEGORICAL})
+    for i, chunk in enumerate(reader):
+        for col in chunk.columns:
+            values = chunk[col]
+            if col in _CATEGORICAL:
+                # Chunk-local codes, remapped to the sorted categories below
+                codes, uniques = pd.factorize(values)
+                known = seen.setdefault(col, {})
+                lut = np.array([known.setdefault(u, len(known)) for u in uniques] + [-1])
+                values = lut[codes]
+            elif col == ID_COLUMN:
+                values = values.astype(str).to_numpy()
+                try:
+                    values = values.astype("S")
+                except UnicodeEncodeError:
+                    values = values.astype("U")
+                id_dtype = values.dtype if id_dtype is None else np.promote_types(id_dtype,
+                                                                                  values.dtype)
+            else:
+                values = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+                narrow[col] = narrow.get(col, True) and _narrow(values).dtype == np.float32
+            part = os.path.join(parts_dir, f"{col}.{i:06d}.npy")
+            np.save(part, values)
+            parts.setdefault(col, []).append(part)
+
+    rows = 0
+    categories, dtypes = {}, {}
+    for col, col_parts in parts.items():
+        if col in _CATEGORICAL:
+            names = sorted(seen[col])
+            order = np.array([seen[col][name] for name in names], dtype=np.int64)
+            remap = np.empty(len(names) + 1, dtype=_code_dtype(len(names)))
+            remap[order] = np.arange(len(names))
+            remap[-1] = -1
+            dtype, convert = remap.dtype, remap.__getitem__
+            categories[col] = names
+        elif col == ID_COLUMN:
+            dtype, convert = id_dtype, None
+        else:
+            dtype, convert = np.dtype(np.float32 if narrow[col] else np.float64), None
+        rows = _write_column(cache_dir, col, col_parts, dtype, convert)
+        dtypes[col] = dtype.str
+    shutil.rmtree(parts_dir)
+
+    meta = {"format": FORMAT_VERSION, "source": source, "rows": rows,
+            "dtypes": dtypes, "categories": categories}
+    # meta.json goes last: a cache without a current one is rebuilt
+    with open(os.path.join(cache_dir, META_FILE + ".tmp"), "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(os.path.join(cache_dir, META_FILE + ".tmp"), os.path.join(cache_dir, META_FILE))
+    return Dataset(cache_dir, meta)
+
+
+def load_dataset(path, cache_dir=None, rebuild=False):
+    """The cached dataset for ``path``, ingesting it first if stale or absent.
+
+    Size and mtime are checked first; only when they moved is the CSV
+    re-hashed, and the cache rebuilt only when the hash differs.
+    """
+    cache_dir = cache_dir or path + CACHE_SUFFIX
+    meta_path = os.path.join(cache_dir, META_FILE)
+    meta = None
+    if not rebuild and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    if meta is None or meta.get("format") != FORMAT_VERSION:
+        return ingest(path, cache_dir)
+
+    st = os.stat(path)
+    source = meta["source"]
+    if (st.st_size, st.st_mtime_ns) != (source["size"], source["mtime_ns"]):
+        if st.st_size != source["size"] or file_sha256(path) != source["sha256"]:
+            return ingest(path, cache_dir)
+        # Touched but unchanged: refresh the stamp so the next load is cheap
+        source["mtime_ns"] = st.st_mtime_ns
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(meta_path + ".tmp", meta_path)
+    return Dataset(cache_dir, meta)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or refresh the columnar cache of a CSV.")
+    parser.add_argument("csv")
+    parser.add_argument("--cache-dir", default=None,
+                        help="cache directory (default: <csv>%s)" % CACHE_SUFFIX)
+    parser.add_argument("--rebuild", action="store_true", help="ignore an existing cache")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    dataset = load_dataset(args.csv, args.cache_dir, rebuild=args.rebuild)
+    ready = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pd.read_csv(args.csv, dtype={c: str for c in _CATEGORICAL})
+    parse = time.perf_counter() - start
+    start = time.perf_counter()
+    X = dataset.encoded(dataset.fit_encoders())
+    encode = time.perf_counter() - start
+
+    print(f"{len(dataset)} rows cached in {dataset.directory} "
+          f"({dataset.nbytes / 1e6:.2f} MB vs {os.path.getsize(args.csv) / 1e6:.2f} MB CSV); "
+          f"ready in {ready * 1000:.1f} ms, encoded {X.shape} in {encode * 1000:.1f} ms "
+          f"vs {parse * 1000:.1f} ms to parse the CSV", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
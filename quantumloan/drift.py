@@ -0,0 +1,343 @@
+"""Streaming drift monitor against the training distribution.
+
+Usage::
+
+    python -m quantumloan.drift profile --data Loan_approvals.csv
+    python -m quantumloan.drift check applicants.csv
+    python -m quantumloan.drift check --audit --start 2026-10-01
+
+Training saves a reference profile next to the bundle (``drift_profile.json``):
+for every feature and for the predicted approval probability, the bin edges
+at the training data's twentieths (one bin per category for categorical
+features) and the training counts per bin, plus a bin for missing values.
+
+Every scored row is binned against those edges into fixed-size count
+arrays, so memory stays constant however many rows are seen. Rows are
+buffered and binned in vectorized batches, which keeps the cost per online
+row to appending it to a list. After each window of ``window_rows`` rows
+the window's counts are compared with the training counts by the population
+stability index (PSI) and, for numeric columns, the Kolmogorov-Smirnov
+distance between the binned distributions. A column alerts when its PSI
+reaches ``PSI_ALERT`` or its KS distance is both significant at
+``KS_ALPHA`` and at least ``KS_MIN``. Alerts go to the log, to the
+``quantumloan_drift_alerts`` counter and, when ``QUANTUMLOAN_DRIFT_ALERT_FILE``
+is set, to a JSON-lines file that a retraining job can watch.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from .features import CATEGORICAL_COLUMNS, FEATURE_COLUMNS
+from .metrics import DRIFT_ALERTS, DRIFT_PSI
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILE = "drift_profile.json"
+SCORE_COLUMN = "approval_probability"
+# Quantile bins per numeric column in the reference profile
+N_BINS = 20
+WINDOW_ROWS = int(os.environ.get("QUANTUMLOAN_DRIFT_WINDOW", "1000"))
+# Online rows collected before they are binned in one batch
+BUFFER_ROWS = 64
+# From this many rows, bins are counted edge by edge instead of row by row
+COUNT_MIN_ROWS = 2048
+PSI_WARN = 0.1
+PSI_ALERT = 0.25
+KS_ALPHA = 0.01
+KS_MIN = 0.1
+# Added to every bin share so empty bins do not make PSI infinite
+PSI_EPSILON = 1e-4
+ALERT_FILE = os.environ.get("QUANTUMLOAN_DRIFT_ALERT_FILE")
+# Monitor scored rows; QUANTUMLOAN_DRIFT=0 disables it
+DRIFT_ENABLED = os.environ.get("QUANTUMLOAN_DRIFT", "1") != "0"
+
+
+def _edges(values, kind, n_classes=None):
+    if kind == "categorical":
+        # Code k falls in bin k
+        return np.arange(n_classes - 1) + 0.5
+    present = values[~np.isnan(values)]
+    if not len(present):
+        return np.empty(0)
+    return np.unique(np.quantile(present, np.arange(1, N_BINS) / N_BINS))
+
+
+def _bin(values, edges):
+    # Bins 0..len(edges) by value (x == edge goes right), then one for missing
+    bins = np.searchsorted(edges, values, side="right")
+    bins[np.isnan(values)] = len(edges) + 1
+    return bins
+
+
+def _counts(values, edges):
+    # Same counts as bincount(_bin(values, edges)) from one comparison per
+    # edge, which beats a per-row binary search on large batches
+    missing = np.count_nonzero(np.isnan(values))
+    at_least = [np.count_nonzero(values >= edge) for edge in edges]
+    bounds = np.array([len(values) - missing] + at_least + [0], dtype=np.int64)
+    return np.append(bounds[:-1] - bounds[1:], missing)
+
+
+def build_profile(X, approval_probability, encoders):
+    """Reference profile of an encoded training matrix and its predicted scores."""
+    columns = {}
+    values = np.column_stack([X, approval_probability])
+    for j, col in enumerate(FEATURE_COLUMNS + [SCORE_COLUMN]):
+        kind = "categorical" if col in CATEGORICAL_COLUMNS else "numeric"
+        n_classes = len(encoders[col].classes_) if kind == "categorical" else None
+        edges = _edges(values[:, j], kind, n_classes)
+        counts = np.bincount(_bin(values[:, j], edges), minlength=len(edges) + 2)
+        columns[col] = {"kind": kind, "edges": edges.tolist(), "counts": counts.tolist()}
+    return {"features": FEATURE_COLUMNS, "rows": len(X), "columns": columns,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+
+
+def write_profile(directory, profile):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, PROFILE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(profile, f, indent=1)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def read_profile(directory):
+    path = os.path.join(directory, PROFILE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        profile = json.load(f)
+    if profile["features"] != FEATURE_COLUMNS:
+        raise ValueError(f"{path} profiles features {profile['features']}")
+    return profile
+
+
+def psi(expected, actual):
+    """Population stability index between two count vectors over the same bins."""
+    e = expected / max(expected.sum(), 1) + PSI_EPSILON
+    a = actual / max(actual.sum(), 1) + PSI_EPSILON
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def ks(expected, actual):
+    """``(distance, critical value)`` of the two-sample KS test on binned counts.
+
+    Missing values (the last bin) are left out. Binning can only hide
+    differences, so the distance is a lower bound on the unbinned one.
+    """
+    e, a = expected[:-1], actual[:-1]
+    n, m = e.sum(), a.sum()
+    if not n or not m:
+        return 0.0, math.inf
+    distance = np.abs(np.cumsum(e) / n - np.cumsum(a) / m).max()
+    critical = math.sqrt(-math.log(KS_ALPHA / 2) / 2) * math.sqrt((n + m) / (n * m))
+    return float(distance), critical
+
+
+class DriftMonitor:
+    """Constant-memory binned counts of scored rows, checked window by window."""
+
+    def __init__(self, profile, window_rows=WINDOW_ROWS, buffer_rows=BUFFER_ROWS, on_alert=None):
+        self.profile = profile
+        self.names = FEATURE_COLUMNS + [SCORE_COLUMN]
+        self.kinds = [profile["columns"][col]["kind"] for col in self.names]
+        self.edges = [np.asarray(profile["columns"][col]["edges"], dtype=np.float64)
+                      for col in self.names]
+        self.reference = [np.asarray(profile["columns"][col]["counts"], dtype=np.int64)
+                          for col in self.names]
+        # Every column's bins live in one flat count array
+        sizes = [len(e) + 2 for e in self.edges]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)])
+        self.window_rows = window_rows
+        self.buffer_rows = buffer_rows
+        self.on_alert = on_alert
+        self.window = np.zeros(self.offsets[-1], dtype=np.int64)
+        self.total = np.zeros(self.offsets[-1], dtype=np.int64)
+        self.windows = 0
+        self.alerts = 0
+        self.last = None
+        self._buffer, self._buffered = [], 0
+        self._lock = threading.Lock()
+
+    def update(self, X, approval_probability):
+        """Add encoded rows ``X`` and their predicted approval probabilities."""
+        with self._lock:
+            self._buffer.append((X, approval_probability))
+            self._buffered += len(X)
+            if self._buffered >= self.buffer_rows:
+                self._fold()
+
+    def _fold(self):
+        if not self._buffer:
+            return
+        X = np.vstack([np.asarray(x, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS))
+                       for x, _ in self._buffer])
+        proba = np.concatenate([np.ravel(p) for _, p in self._buffer]).astype(np.float64)
+        self._buffer, self._buffered = [], 0
+        # Column-major, so each column is binned from contiguous memory
+        values = np.empty((len(self.edges), len(X)))
+        values[:-1] = X.T
+        values[-1] = proba
+        if len(X) >= COUNT_MIN_ROWS:
+            for j, edges in enumerate(self.edges):
+                self.window[self.offsets[j]:self.offsets[j + 1]] += _counts(values[j], edges)
+        else:
+            bins = np.empty(values.shape, dtype=np.intp)
+            for j, edges in enumerate(self.edges):
+                bins[j] = _bin(values[j], edges)
+                bins[j] += self.offsets[j]
+            self.window += np.bincount(bins.ravel(), minlength=len(self.window))
+        if self.window_rows and self._window_size() >= self.window_rows:
+            self._close_window()
+
+    def _window_size(self):
+        return int(self.window[:self.offsets[1]].sum())
+
+    def _close_window(self):
+        self.last = self.compare(self.window)
+        self.windows += 1
+        self.total += self.window
+        self.window[:] = 0
+        alerts = []
+        for col, stats in self.last["columns"].items():
+            DRIFT_PSI.set(stats["psi"], feature=col)
+            if stats["status"] == "alert":
+                DRIFT_ALERTS.inc(feature=col)
+                alerts.append(col)
+        if alerts:
+            self.alerts += 1
+            self._alert(alerts)
+
+    def _alert(self, columns):
+        logger.warning("Drift from training in %s over the last %d rows",
+                       ", ".join(columns), self.last["rows"])
+        event = dict(self.last, alerts=columns,
+                     at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+        if ALERT_FILE:
+            with open(ALERT_FILE, "a") as f:
+                f.write(json.dumps(event) + "\n")
+        if self.on_alert is not None:
+            self.on_alert(event)
+
+    def compare(self, counts):
+        """PSI, KS and status per column of a flat count array against training."""
+        columns = {}
+        for j, col in enumerate(self.names):
+            actual = counts[self.offsets[j]:self.offsets[j + 1]]
+            expected = self.reference[j]
+            stats = {"psi": psi(expected, actual),
+                     "missing": float(actual[-1] / max(actual.sum(), 1))}
+            alert = stats["psi"] >= PSI_ALERT
+            if self.kinds[j] == "numeric":
+                stats["ks"], critical = ks(expected, actual)
+                alert |= stats["ks"] > critical and stats["ks"] >= KS_MIN
+            stats["status"] = "alert" if alert else "warn" if stats["psi"] >= PSI_WARN else "ok"
+            columns[col] = stats
+        return {"rows": int(counts[:self.offsets[1]].sum()), "columns": columns}
+
+    def flush(self):
+        """Bin any buffered rows now."""
+        with self._lock:
+            self._fold()
+
+    def report(self):
+        """Comparison of the last closed window and of every row seen so far."""
+        with self._lock:
+            self._fold()
+            return {"windows": self.windows, "alerts": self.alerts, "last_window": self.last,
+                    "overall": self.compare(self.total + self.window)}
+
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def get_drift_monitor(bundle):
+    """The process-wide monitor for ``bundle``'s profile, or ``None`` without one."""
+    if not DRIFT_ENABLED:
+        return None
+    key = (bundle.directory, bundle.version)
+    if key not in _monitors:
+        with _monitors_lock:
+            if key not in _monitors:
+                profile = read_profile(bundle.directory)
+                _monitors[key] = DriftMonitor(profile) if profile is not None else None
+    return _monitors[key]
+
+
+def format_report(result):
+    lines = [f"{'column':<22} {'psi':>8} {'ks':>8} {'missing':>8}  status"]
+    for col, stats in result["columns"].items():
+        ks_text = f"{stats['ks']:.3f}" if "ks" in stats else "-"
+        lines.append(f"{col:<22} {stats['psi']:>8.3f} {ks_text:>8} "
+                     f"{stats['missing']:>8.1%}  {stats['status']}")
+    return "\n".join(lines)
+
+
+def _profile_from_csv(data, bundle):
+    from .dataset import load_dataset
+    from .inference import score_matrix
+
+    dataset = load_dataset(data)
+    X = dataset.encoded(bundle.encoders)
+    return build_profile(X, score_matrix(bundle, X).approval_probability, bundle.encoders)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile training data or check scored data for drift.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    profile = sub.add_parser("profile", help="write the reference profile for a bundle")
+    profile.add_argument("--data", default="Loan_approvals.csv")
+    check = sub.add_parser("check", help="compare applicants with the reference profile")
+    check.add_argument("input", nargs="?", help="applicant CSV (Loan_approvals.csv columns)")
+    check.add_argument("--audit", action="store_true", help="check decisions in the audit log")
+    check.add_argument("--start", help="with --audit: ISO time or Unix seconds")
+    check.add_argument("--end", help="with --audit: ISO time or Unix seconds")
+    check.add_argument("--window-rows", type=int, default=WINDOW_ROWS)
+    for cmd in (profile, check):
+        cmd.add_argument("--bundle-dir", default=None)
+    args = parser.parse_args(argv)
+
+    from .bundle import get_bundle
+    bundle = get_bundle(args.bundle_dir)
+    if args.command == "profile":
+        path = write_profile(bundle.directory, _profile_from_csv(args.data, bundle))
+        print(f"Wrote {path} from {args.data}")
+        return 0
+
+    reference = read_profile(bundle.directory)
+    if reference is None:
+        parser.error(f"no {PROFILE_FILE} in {bundle.directory}; run the profile command first")
+    monitor = DriftMonitor(reference, window_rows=args.window_rows)
+    if args.audit:
+        from .audit import _parse_time, read_log
+        records = read_log(start=args.start and _parse_time(args.start),
+                           end=args.end and _parse_time(args.end))
+        scored = ~np.isnan(records.approval_probability)
+        monitor.update(records.X[scored], records.approval_probability[scored])
+    elif args.input:
+        from .batch import read_chunks
+        from .features import encode_frame
+        from .inference import score_matrix
+        for chunk in read_chunks(args.input):
+            X = encode_frame(chunk, bundle.encoders)
+            monitor.update(X, score_matrix(bundle, X).approval_probability)
+    else:
+        parser.error("give an applicant CSV or --audit")
+    report = monitor.report()
+    print(f"{report['overall']['rows']} rows, {report['windows']} windows of "
+          f"{args.window_rows}, {report['alerts']} with alerts")
+    print(format_report(report["overall"]))
+    return 1 if report["alerts"] or any(
+        s["status"] == "alert" for s in report["overall"]["columns"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""Per-prediction feature contributions from the forest's decision paths.
+
+Every split on a row's path moves the approval probability from the parent
+node's value to the child's; that change is credited to the split feature
+(Saabas-style path attribution). Summed along the path and averaged over the
+trees, the contributions plus the forest's mean root value add up to the
+predicted approval probability exactly.
+
+The per-leaf contribution vectors are precomputed once per bundle, next to
+each leaf's probability. Explaining a batch is the same tree walk as
+scoring (the flat forest for small batches, sklearn's ``apply`` for large
+ones) plus one gather-and-add per tree that yields contributions and
+probabilities together, so it costs about as much as scoring. Identical
+feature rows in a batch are explained once.
+"""
+import numpy as np
+
+from .features import FEATURE_COLUMNS, TARGET_COLUMN, scale_matrix
+from .forest import _CUMSUM_LIMIT, BLOCK_ROWS, FLAT_MAX_ROWS
+from .inference import APPROVED_LABEL
+
+
+class PathExplainer:
+    """Leaf-level contribution table for one flat forest and output class."""
+
+    def __init__(self, forest, class_index):
+        value = forest.value[:, class_index]
+        is_leaf = ~np.isfinite(forest.threshold)
+        n_features = forest.n_features
+        self.forest = forest
+        self.class_index = class_index
+        self.leaf_row = np.full(forest.n_nodes, -1, dtype=np.int64)
+        self.leaf_row[is_leaf] = np.arange(np.count_nonzero(is_leaf))
+        # Per leaf: path contribution of every feature, then the leaf's value
+        self.leaf_table = np.zeros((np.count_nonzero(is_leaf), n_features + 1))
+        self.leaf_table[:, n_features] = value[is_leaf]
+        self.bias = value[forest.roots].mean()
+
+        # Walk all trees level by level, carrying each node's path sum
+        nodes = forest.roots.astype(np.int64)
+        acc = np.zeros((len(nodes), n_features))
+        while len(nodes):
+            leaf = is_leaf[nodes]
+            self.leaf_table[self.leaf_row[nodes[leaf]], :n_features] = acc[leaf]
+            parents, acc = nodes[~leaf], acc[~leaf]
+            children = np.concatenate([forest.left[parents], forest.right[parents]])
+            acc = np.concatenate([acc, acc])
+            split = np.tile(forest.feature[parents], 2)
+            gain = value[children] - np.tile(value[parents], 2)
+            acc[np.arange(len(children)), split] += gain
+            nodes = children.astype(np.int64)
+
+    def explain_leaves(self, leaves):
+        """``(contributions, probability)`` for leaves of shape ``(n_rows, n_trees)``.
+
+        Leaf values are added in tree order, so the probability is the same
+        float as ``predict_proba``'s.
+        """
+        rows = self.leaf_row[leaves]
+        if rows.size <= _CUMSUM_LIMIT // self.leaf_table.shape[1]:
+            total = np.cumsum(self.leaf_table[rows], axis=1)[:, -1] / self.forest.n_trees
+            return total[:, :-1], total[:, -1]
+        total = np.empty((len(rows), self.leaf_table.shape[1]))
+        for i in range(0, len(rows), BLOCK_ROWS):
+            block = rows[i:i + BLOCK_ROWS]
+            acc = np.zeros((len(block), self.leaf_table.shape[1]))
+            for t in range(self.forest.n_trees):
+                acc += self.leaf_table[block[:, t]]
+            total[i:i + BLOCK_ROWS] = acc
+        total /= self.forest.n_trees
+        return total[:, :-1], total[:, -1]
+
+
+class Explanation:
+    """Contributions for a batch, plus the probabilities they add up to."""
+
+    def __init__(self, bias, contributions, approval_probability):
+        self.bias = bias
+        self.contributions = contributions
+        self.approval_probability = approval_probability
+
+    def __len__(self):
+        return len(self.contributions)
+
+    def top(self, i, k=4):
+        """The ``k`` largest ``(feature, contribution)`` pairs of row ``i`` by size."""
+        row = self.contributions[i]
+        order = np.argsort(-np.abs(row), kind="stable")[:k]
+        return [(FEATURE_COLUMNS[j], float(row[j])) for j in order]
+
+    def columns(self, prefix="contribution_"):
+        """Contributions as a ``{column name: array}`` dict for output frames."""
+        return {prefix + col: self.contributions[:, j] for j, col in enumerate(FEATURE_COLUMNS)}
+
+
+def explainer_for(bundle):
+    """Build the explainer for ``bundle``'s serving forest (folded if available)."""
+    forest = bundle.folded if bundle.folded is not None else bundle.forest
+    approved = list(bundle.encoders[TARGET_COLUMN].classes_).index(APPROVED_LABEL)
+    return PathExplainer(forest, int(np.flatnonzero(forest.classes_ == approved)[0]))
+
+
+def _unique_rows(X):
+    import pandas as pd
+
+    # Exact byte-level dedupe; adding 0.0 folds -0.0 into 0.0
+    keys = np.ascontiguousarray(X + 0.0).view(np.dtype((np.void, X.shape[1] * X.itemsize)))
+    inverse, _ = pd.factorize(keys.ravel())
+    first = np.full(inverse.max() + 1, -1, dtype=np.int64)
+    first[inverse[::-1]] = np.arange(len(X))[::-1]
+    return first, inverse
+
+
+def explain_matrix(bundle, X, dedupe=True):
+    """Explain an encoded (unscaled) matrix with ``bundle``.
+
+    Small batches walk the flat forest like ``predict_proba_encoded``;
+    large ones take leaf indices from sklearn's compiled ``apply``. With
+    ``dedupe`` repeated rows are explained once.
+    """
+    explainer = bundle.explainer
+    forest = explainer.forest
+    X = np.asarray(X, dtype=np.float64)
+    inverse = None
+    if dedupe and len(X) > 1:
+        first, inverse = _unique_rows(X)
+        X = X[first]
+    if len(X) <= FLAT_MAX_ROWS:
+        leaves = forest.apply(X if bundle.folded is not None else scale_matrix(X, bundle.scaler))
+    else:
+        # Folding keeps the node layout, so sklearn's per-tree node ids map
+        # onto the flat arrays by each tree's root offset
+        leaves = bundle.model.apply(scale_matrix(X, bundle.scaler)) + forest.roots
+    contributions, proba = explainer.explain_leaves(leaves)
+    if inverse is not None:
+        contributions, proba = contributions[inverse], proba[inverse]
+    return Explanation(explainer.bias, contributions, proba)
@@ -0,0 +1,181 @@
+"""Feature pipeline shared by training and serving.
+
+The model is trained on the 11 raw columns of ``Loan_approvals.csv`` with the
+string columns label-encoded. Everything here works on whole DataFrames at
+once; a single applicant is just a one-row frame. pandas and sklearn are
+imported where they are needed, so the serving path (``encode_records`` and
+``scale_matrix``) starts without them.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+ID_COLUMN = "Loan_ID"
+TARGET_COLUMN = "Loan_Status"
+FEATURE_COLUMNS = [
+    "Gender", "Married", "Dependents", "Education", "Self_Employed",
+    "ApplicantIncome", "CoapplicantIncome", "LoanAmount", "Loan_Amount_Term",
+    "Credit_History", "Property_Area",
+]
+CATEGORICAL_COLUMNS = [
+    "Gender", "Married", "Dependents", "Education", "Self_Employed", "Property_Area",
+]
+NUMERIC_COLUMNS = [c for c in FEATURE_COLUMNS if c not in CATEGORICAL_COLUMNS]
+
+SCHEMA_FILE = "feature_schema.json"
+
+
+class SchemaMismatchError(Exception):
+    """Raised when a model, scaler or encoders disagree with the feature schema."""
+
+
+def fit_encoders(df):
+    """Fit one ``LabelEncoder`` per categorical column and the target."""
+    from sklearn.preprocessing import LabelEncoder
+
+    encoders = {}
+    for col in CATEGORICAL_COLUMNS + [TARGET_COLUMN]:
+        encoders[col] = LabelEncoder().fit(df[col].astype(str))
+    return encoders
+
+
+def encode_frame(df, encoders):
+    """Encode the feature columns of ``df`` into a float64 matrix.
+
+    Categorical columns are mapped to their ``LabelEncoder`` codes in one
+    vectorized lookup; missing values (None, NaN or blank) stay NaN. Unknown
+    categories and non-numeric numbers raise ``ValueError`` naming the column.
+    """
+    import pandas as pd
+
+    missing = [c for c in FEATURE_COLUMNS if c not in df.columns]
+    if missing:
+        raise SchemaMismatchError(f"Input is missing columns: {', '.join(missing)}")
+
+    X = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for j, col in enumerate(FEATURE_COLUMNS):
+        values = df[col]
+        if col in encoders:
+            present = values.notna().to_numpy()
+            codes = pd.Categorical(values.astype(str), categories=encoders[col].classes_).codes
+            unknown = present & (codes < 0)
+            if unknown.any():
+                bad = sorted(set(values[unknown].astype(str)))[:5]
+                raise ValueError(f"Unknown {col} value(s): {', '.join(bad)}")
+            X[:, j] = np.where(present, codes, np.nan)
+        else:
+            numbers = pd.to_numeric(values, errors="coerce")
+            # Only inspect the strings when coercion turned something into NaN
+            if numbers.isna().sum() > values.isna().sum():
+                text = values.astype(str).str.strip()
+                invalid = numbers.isna() & values.notna() & (text != "")
+                if invalid.any():
+                    bad = sorted(set(text[invalid]))[:5]
+                    raise ValueError(f"Invalid {col} value(s): {', '.join(bad)}")
+            X[:, j] = numbers.to_numpy(dtype=np.float64)
+    return X
+
+
+def encode_records(records, encoders):
+    """Encode a short list of applicant dicts without building a DataFrame.
+
+    Same result as ``encode_frame`` on ``pd.DataFrame(records)``, but
+    without pandas' per-call overhead for the one-row requests of the app
+    and the HTTP service.
+    """
+    codes = {col: {str(c): i for i, c in enumerate(encoders[col].classes_)}
+             for col in CATEGORICAL_COLUMNS}
+    X = np.empty((len(records), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for i, record in enumerate(records):
+        missing = [c for c in FEATURE_COLUMNS if c not in record]
+        if missing:
+            raise SchemaMismatchError(f"Input is missing columns: {', '.join(missing)}")
+        for j, col in enumerate(FEATURE_COLUMNS):
+            value = record[col]
+            if (value is None or (isinstance(value, float) and value != value)
+                    or (isinstance(value, str) and not value.strip())):
+                X[i, j] = np.nan
+            elif col in codes:
+                code = codes[col].get(str(value))
+                if code is None:
+                    raise ValueError(f"Unknown {col} value(s): {value}")
+                X[i, j] = code
+            else:
+                try:
+                    X[i, j] = float(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Invalid {col} value(s): {value}") from None
+    return X
+
+
+def scale_matrix(X, scaler):
+    """Apply a fitted ``StandardScaler`` and mean-impute missing values.
+
+    Same arithmetic as ``scaler.transform``. Training imputes NaNs with the
+    column mean after scaling, which is 0 in the scaled space.
+    """
+    X = np.array(X, dtype=np.float64)
+    if getattr(scaler, "with_mean", True):
+        X -= scaler.mean_
+    if getattr(scaler, "with_std", True):
+        X /= scaler.scale_
+    np.nan_to_num(X, copy=False, nan=0.0)
+    return X
+
+
+def transform(df, bundle):
+    """Encode and scale a DataFrame of applicants with ``bundle``."""
+    return scale_matrix(encode_frame(df, bundle.encoders), bundle.scaler)
+
+
+def build_schema(encoders):
+    """Feature schema for a set of fitted encoders."""
+    schema = {
+        "features": list(FEATURE_COLUMNS),
+        "categories": {
+            col: [str(c) for c in encoders[col].classes_] for col in CATEGORICAL_COLUMNS
+        },
+        "target": TARGET_COLUMN,
+        "target_classes": [str(c) for c in encoders[TARGET_COLUMN].classes_],
+    }
+    schema["id"] = hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()[:12]
+    return schema
+
+
+def write_schema(directory, schema):
+    path = os.path.join(directory, SCHEMA_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(schema, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def read_schema(directory):
+    path = os.path.join(directory, SCHEMA_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_schema(schema, model, scaler, encoders):
+    """Raise ``SchemaMismatchError`` unless all artifacts agree with ``schema``."""
+    features = schema["features"]
+    if features != FEATURE_COLUMNS:
+        raise SchemaMismatchError(f"Schema features {features} != pipeline {FEATURE_COLUMNS}")
+
+    for name, est in (("model", model), ("scaler", scaler)):
+        n = getattr(est, "n_features_in_", None)
+        if n is not None and n != len(features):
+            raise SchemaMismatchError(f"{name} expects {n} features, schema has {len(features)}")
+    names = getattr(scaler, "feature_names_in_", None)
+    if names is not None and list(names) != features:
+        raise SchemaMismatchError(f"Scaler was fitted on {list(names)}, schema has {features}")
+
+    for col, classes in schema["categories"].items():
+        if col not in encoders:
+            raise SchemaMismatchError(f"No encoder for {col}")
+        if [str(c) for c in encoders[col].classes_] != classes:
+            raise SchemaMismatchError(f"Encoder classes for {col} differ from schema")
@@ -0,0 +1,245 @@
+"""Incremental retraining on rows appended to the training CSV.
+
+Usage::
+
+    python -m quantumloan.incremental --data Loan_approvals.csv --bundle-dir .
+
+A full run of ``quantumloan.train`` records in the bundle manifest how many
+bytes and rows of the CSV it consumed. An incremental run then:
+
+1. checks the CSV still starts with exactly those bytes (append-only),
+2. reads and encodes only the rows after them with the existing encoders,
+3. updates the scaler's mean and variance with ``partial_fit`` and moves
+   every existing split threshold so the old trees still split on the same
+   raw values,
+4. grows new trees on the new rows (SMOTE-balanced) with ``warm_start``,
+5. writes the new bundle with one more lineage entry.
+
+A full rebuild is required instead when the file was rewritten, new rows
+carry unseen categories, the new rows drift from the scaler statistics or
+incremental trees make up too much of the forest.
+"""
+import argparse
+import copy
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from .bundle import MANIFEST_COMPUTED, load_bundle, read_manifest, save_bundle
+from .dataset import file_sha256
+from .features import (
+    CATEGORICAL_COLUMNS, FEATURE_COLUMNS, NUMERIC_COLUMNS, TARGET_COLUMN, encode_frame,
+    scale_matrix,
+)
+from .forest import _raw_thresholds, scaler_arrays
+from .train import _require_imblearn
+
+logger = logging.getLogger(__name__)
+
+MIN_NEW_ROWS = 20
+# Standardized shift of a numeric column's mean that calls for a rebuild
+DRIFT_MEAN_SHIFT = 0.5
+# Share of the forest grown incrementally before a rebuild is required
+MAX_INCREMENTAL_SHARE = 0.5
+
+
+class IncrementalError(Exception):
+    """Raised when the bundle cannot be updated and needs a full rebuild."""
+
+
+def read_appended(path, offset):
+    """Rows of the CSV at ``path`` that start after byte ``offset``."""
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(offset)
+        tail = f.read()
+    return pd.read_csv(io.BytesIO(header + tail), dtype={c: str for c in CATEGORICAL_COLUMNS})
+
+
+def rescale_thresholds(model, old_scaler, new_scaler):
+    """Move every split of ``model`` from ``old_scaler``'s space to ``new_scaler``'s.
+
+    Each threshold is mapped back to the exact raw value it separates (see
+    ``forest._raw_thresholds``) and forward through the new scaler, so the
+    trees keep routing raw inputs as before, up to the float32 rounding
+    that the scaled comparison already had.
+    """
+    n = model.n_features_in_
+    old_mean, old_scale = scaler_arrays(old_scaler, n)
+    new_mean, new_scale = scaler_arrays(new_scaler, n)
+    for est in model.estimators_:
+        tree = est.tree_
+        split = tree.feature >= 0
+        f = tree.feature[split]
+        raw = _raw_thresholds(tree.threshold[split], old_mean[f], old_scale[f])
+        with np.errstate(over="ignore", invalid="ignore"):
+            moved = ((raw - new_mean[f]) / new_scale[f]).astype(np.float32)
+        # tree_.threshold is a view on the node array, so this edits the tree
+        tree.threshold[split] = moved
+
+
+def drift_reasons(X_new, scaler, lineage):
+    """Reasons the new rows call for a full rebuild rather than an update."""
+    reasons = []
+    mean, scale = scaler_arrays(scaler, len(FEATURE_COLUMNS))
+    for col in NUMERIC_COLUMNS:
+        j = FEATURE_COLUMNS.index(col)
+        values = X_new[:, j][~np.isnan(X_new[:, j])]
+        if len(values):
+            shift = abs(values.mean() - mean[j]) / scale[j]
+            if shift > DRIFT_MEAN_SHIFT:
+                reasons.append(f"{col} mean moved {shift:.2f} standard deviations")
+    base = next(e for e in reversed(lineage) if e["kind"] == "full")
+    total = lineage[-1]["n_estimators"]
+    grown = total - base["n_estimators"]
+    if total and grown / total > MAX_INCREMENTAL_SHARE:
+        reasons.append(f"{grown} of {total} trees were grown incrementally")
+    return reasons
+
+
+def _balance(X, y, random_state):
+    minority = np.bincount(y).min()
+    if minority < 2:
+        return X, y
+    SMOTE, _ = _require_imblearn()
+    return SMOTE(k_neighbors=min(5, minority - 1), random_state=random_state).fit_resample(X, y)
+
+
+def update(data_path, bundle_dir=".", output_dir=None, n_trees=None, max_trees=None,
+           min_rows=MIN_NEW_ROWS, random_state=None, rebuild_on_drift=False):
+    """Fold the rows appended to ``data_path`` into the bundle in ``bundle_dir``.
+
+    Returns a report dict whose ``status`` is ``"updated"``, ``"skipped"``
+    (fewer than ``min_rows`` new rows) or ``"rebuilt"`` (``rebuild_on_drift``
+    and a rebuild was needed). Without ``rebuild_on_drift`` a required
+    rebuild raises ``IncrementalError``.
+    """
+    start = time.perf_counter()
+    output_dir = output_dir or bundle_dir
+    manifest = read_manifest(bundle_dir) or {}
+    lineage = manifest.get("lineage")
+    if not lineage:
+        raise IncrementalError(
+            f"Bundle in {bundle_dir} has no training lineage; run python -m quantumloan.train first"
+        )
+    last = lineage[-1]
+
+    def rebuild(reason):
+        if not rebuild_on_drift:
+            raise IncrementalError(f"{reason}; a full rebuild is required")
+        from .train import train
+        logger.warning("%s; running a full rebuild", reason)
+        report = train(data_path, output_dir)
+        return {"status": "rebuilt", "reason": reason, "bundle_version": report["bundle_version"],
+                "wall_seconds": time.perf_counter() - start}
+
+    if os.path.getsize(data_path) < last["data_bytes"] or \
+            file_sha256(data_path, last["data_bytes"]) != last["data_sha256"]:
+        return rebuild(f"{data_path} was rewritten since bundle {manifest['version']}")
+
+    df = read_appended(data_path, last["data_bytes"])
+    if len(df) < min_rows:
+        return {"status": "skipped", "new_rows": len(df), "min_rows": min_rows,
+                "bundle_version": manifest["version"]}
+
+    # Updating needs the fitted sklearn objects, not the serving tables
+    bundle = load_bundle(bundle_dir, artifact=False)
+    try:
+        X_new = encode_frame(df, bundle.encoders)
+        y_new = bundle.encoders[TARGET_COLUMN].transform(df[TARGET_COLUMN].astype(str))
+    except ValueError as exc:
+        return rebuild(f"New rows do not fit the encoders ({exc})")
+    if len(np.unique(y_new)) < len(bundle.model.classes_):
+        raise IncrementalError("New rows hold a single class; append more before updating")
+
+    reasons = drift_reasons(X_new, bundle.scaler, lineage)
+    if reasons:
+        return rebuild("; ".join(reasons))
+
+    scaler = copy.deepcopy(bundle.scaler)
+    if hasattr(scaler, "feature_names_in_"):
+        scaler.partial_fit(pd.DataFrame(X_new, columns=FEATURE_COLUMNS))
+    else:
+        scaler.partial_fit(X_new)
+    model = bundle.model
+    rescale_thresholds(model, bundle.scaler, scaler)
+
+    n_old = len(model.estimators_)
+    if n_trees is None:
+        # Weight the new rows by their share of all rows seen so far
+        n_trees = max(1, round(n_old * len(df) / last["data_rows"]))
+    X_fit, y_fit = _balance(scale_matrix(X_new, scaler), y_new, random_state)
+    if random_state is not None:
+        model.set_params(random_state=random_state)
+    model.set_params(warm_start=True, n_estimators=n_old + n_trees)
+    model.fit(X_fit, y_fit)
+    model.set_params(warm_start=False)
+    retired = 0
+    if max_trees is not None and len(model.estimators_) > max_trees:
+        retired = len(model.estimators_) - max_trees
+        model.estimators_ = model.estimators_[retired:]
+        model.set_params(n_estimators=max_trees)
+
+    trained_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    entry = {
+        "kind": "incremental",
+        "parent": manifest["version"],
+        "trained_at": trained_at,
+        "data_sha256": file_sha256(data_path),
+        "data_bytes": os.path.getsize(data_path),
+        "data_rows": last["data_rows"] + len(df),
+        "new_rows": len(df),
+        "trees_added": n_trees,
+        "trees_retired": retired,
+        "n_estimators": len(model.estimators_),
+        "scaler_samples": int(np.max(scaler.n_samples_seen_)),
+    }
+    extra = {k: v for k, v in manifest.items() if k not in MANIFEST_COMPUTED}
+    extra.update(trained_at=trained_at, data_sha256=entry["data_sha256"],
+                 lineage=lineage + [entry])
+    new_manifest = save_bundle(output_dir, model, scaler, bundle.encoders, extra=extra)
+    # Fail here, not in the next process that serves it, if the write is inconsistent
+    load_bundle(output_dir)
+    return dict(entry, status="updated", bundle_version=new_manifest["version"],
+                wall_seconds=time.perf_counter() - start)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Update the bundle with newly appended rows.")
+    parser.add_argument("--data", default="Loan_approvals.csv")
+    parser.add_argument("--bundle-dir", default=".")
+    parser.add_argument("--output-dir", default=None,
+                        help="where to write the updated bundle (default: --bundle-dir)")
+    parser.add_argument("--trees", type=int, default=None,
+                        help="trees to grow (default: proportional to the new rows' share)")
+    parser.add_argument("--max-trees", type=int, default=None,
+                        help="retire the oldest trees beyond this many")
+    parser.add_argument("--min-rows", type=int, default=MIN_NEW_ROWS)
+    parser.add_argument("--random-state", type=int, default=None)
+    parser.add_argument("--rebuild-on-drift", action="store_true",
+                        help="run a full training instead of failing")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        report = update(args.data, args.bundle_dir, args.output_dir, n_trees=args.trees,
+                        max_trees=args.max_trees, min_rows=args.min_rows,
+                        random_state=args.random_state, rebuild_on_drift=args.rebuild_on_drift)
+    except IncrementalError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""One-pass scoring API shared by the app, batch scorer and services.
+
+Label, class probabilities and confidence all come from a single forest
+evaluation; nothing here calls ``predict`` after ``predict_proba``.
+"""
+import numpy as np
+
+from .features import TARGET_COLUMN, encode_frame
+
+APPROVED_LABEL = "Y"
+
+
+class ScoreResult:
+    """Scores for a batch of applicants, derived from one probability matrix."""
+
+    def __init__(self, bundle, proba):
+        self.proba = proba
+        self.classes = bundle.forest.classes_
+        best = proba.argmax(axis=1)
+        # Same tie-breaking as sklearn's predict: first class with max proba
+        self.labels = self.classes.take(best)
+        self.label_names = bundle.encoders[TARGET_COLUMN].classes_[self.labels]
+        self.confidence = proba[np.arange(len(proba)), best]
+        approved_code = list(bundle.encoders[TARGET_COLUMN].classes_).index(APPROVED_LABEL)
+        positive = int(np.flatnonzero(self.classes == approved_code)[0])
+        self.approval_probability = proba[:, positive]
+        self.approved = self.labels == approved_code
+
+    def __len__(self):
+        return len(self.proba)
+
+    def row(self, i):
+        """Plain dict for one applicant (handy for JSON responses)."""
+        return {
+            "decision": "Approved" if self.approved[i] else "Rejected",
+            "label": str(self.label_names[i]),
+            "approval_probability": float(self.approval_probability[i]),
+            "confidence": float(self.confidence[i]),
+        }
+
+
+def score_matrix(bundle, X):
+    """Score an encoded (unscaled) feature matrix in one forest pass."""
+    return ScoreResult(bundle, bundle.predict_proba_encoded(X))
+
+
+def score_frame(bundle, df):
+    """Encode and score a DataFrame of raw applicant columns."""
+    return score_matrix(bundle, encode_frame(df, bundle.encoders))
@@ -0,0 +1,279 @@
+"""Always-on, in-process metrics in the Prometheus text format.
+
+The scoring paths record per-stage latency histograms, predictions by
+outcome, random-fallback events, drift (``quantumloan.drift``) and challenger
+agreement (``quantumloan.shadow``) here. An observation costs a few
+microseconds (a bisect and a locked increment), so nothing is sampled.
+
+Metrics are exposed three ways:
+
+* ``GET /metrics`` on the HTTP scoring service,
+* ``start_http_server(port)``, which the app starts when
+  ``QUANTUMLOAN_METRICS_PORT`` is set,
+* ``dump(path)``, written by the app every ``QUANTUMLOAN_METRICS_DUMP_INTERVAL``
+  seconds when ``QUANTUMLOAN_METRICS_FILE`` is set and by
+  ``quantumloan.batch --metrics-file``.
+"""
+import bisect
+import http.server
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans a flat-forest row (~10 us) up to a cold bundle load
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+METRICS_FILE = os.environ.get("QUANTUMLOAN_METRICS_FILE")
+METRICS_PORT = os.environ.get("QUANTUMLOAN_METRICS_PORT")
+DUMP_INTERVAL = float(os.environ.get("QUANTUMLOAN_METRICS_DUMP_INTERVAL", "10"))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs
+    )
+    return "{" + inner + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self, items):
+        for key, value in items:
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(_Metric):
+    """Last value set per label set."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels))
+
+    def _render_samples(self, items):
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value!r}"
+
+
+class Histogram(_Metric):
+    """Fixed-bucket distribution per label set (observations in seconds)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def summary(self, **labels):
+        """Count, sum and mean of one label set (``None`` when unobserved)."""
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return None
+        return {"count": state[2], "sum": state[1], "mean": state[1] / state[2]}
+
+    def _render_samples(self, items):
+        for key, (counts, total, count) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, [("le", le)])
+                yield f"{self.name}_bucket{labels} {running}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {total!r}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "quantumloan_stage_seconds",
+    "Wall time of one scoring stage (load, encode, scale, predict, render, ...).",
+    ("source", "stage"),
+))
+PREDICTIONS = REGISTRY.register(Counter(
+    "quantumloan_predictions",
+    "Applicants scored, by decision.",
+    ("source", "outcome"),
+))
+FALLBACKS = REGISTRY.register(Counter(
+    "quantumloan_random_fallbacks",
+    "Decisions made up at random instead of by the model.",
+    ("source", "reason"),
+))
+DRIFT_PSI = REGISTRY.register(Gauge(
+    "quantumloan_drift_psi",
+    "Population stability index of the last monitoring window against training.",
+    ("feature",),
+))
+DRIFT_ALERTS = REGISTRY.register(Counter(
+    "quantumloan_drift_alerts",
+    "Monitoring windows in which a feature or the score drifted from training.",
+    ("feature",),
+))
+SHADOW_ROWS = REGISTRY.register(Counter(
+    "quantumloan_shadow_rows",
+    "Rows a challenger bundle scored in shadow, by agreement with the champion's decision.",
+    ("challenger", "agreement"),
+))
+SHADOW_SECONDS = REGISTRY.register(Histogram(
+    "quantumloan_shadow_seconds",
+    "Wall time of one challenger's forest pass over a shadow batch.",
+    ("challenger",),
+))
+SHADOW_DROPPED = REGISTRY.register(Counter(
+    "quantumloan_shadow_dropped_rows",
+    "Rows not shadow-scored because the challengers had fallen behind.",
+))
+AUDIT_DROPPED = REGISTRY.register(Counter(
+    "quantumloan_audit_dropped_rows",
+    "Decisions not written to the audit log: its queue was full, its writer had stopped, "
+    "or the block could not be encoded.",
+))
+
+
+def count_outcomes(source, approved):
+    """Add a batch of boolean approvals to ``PREDICTIONS``."""
+    n_approved = int(approved.sum())
+    if n_approved:
+        PREDICTIONS.inc(n_approved, source=source, outcome="Approved")
+    if len(approved) - n_approved:
+        PREDICTIONS.inc(len(approved) - n_approved, source=source, outcome="Rejected")
+
+
+def dump(path, registry=REGISTRY):
+    """Write the exposition text to ``path`` atomically."""
+    with open(path + ".tmp", "w") as f:
+        f.write(registry.render())
+    os.replace(path + ".tmp", path)
+
+
+_last_dump = [0.0]
+
+
+def maybe_dump(path=METRICS_FILE, interval=DUMP_INTERVAL):
+    """``dump`` at most once per ``interval`` seconds; no-op without a path."""
+    now = time.monotonic()
+    if path and now - _last_dump[0] >= interval:
+        _last_dump[0] = now
+        dump(path)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve ``/metrics`` from a daemon thread, once per process."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = http.server.ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="quantumloan-metrics",
+                             daemon=True).start()
+    return _server.server_address
@@ -0,0 +1,184 @@
+"""Latency- and size-aware model selection.
+
+Usage::
+
+    python -m quantumloan.selection --data Loan_approvals.csv --tolerance 0.01 \\
+        --report pareto_report.json --export-dir bundles/small
+
+Sweeps ``n_estimators`` / ``max_depth`` / ``ccp_alpha`` (cost-complexity
+pruning) with the training pipeline, cross-validating candidates in
+parallel. It then measures each fitted forest's single-row and batch
+latency and its size on disk, marks the accuracy/latency/size Pareto front,
+and can export the smallest model whose CV accuracy is within
+``--tolerance`` of the best one.
+"""
+import argparse
+import itertools
+import json
+import logging
+import pickle
+import sys
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.model_selection import StratifiedKFold, cross_val_score, train_test_split
+
+from .bundle import save_bundle
+from .dataset import file_sha256
+from .forest import FlatForest, fold_scaler
+from .train import build_pipeline, load_training_data
+
+SWEEP = {
+    "n_estimators": [10, 25, 50, 100, 200],
+    "max_depth": [3, 5, 8, None],
+    "ccp_alpha": [0.0, 0.002, 0.01],
+}
+LATENCY_BATCH_ROWS = 1000
+
+
+def candidates(sweep=None):
+    sweep = sweep or SWEEP
+    names = sorted(sweep)
+    return [dict(zip(names, values)) for values in itertools.product(*(sweep[n] for n in names))]
+
+
+def _fit_candidate(params, X_train, y_train, cv, random_state):
+    pipe = build_pipeline(random_state)
+    pipe.set_params(**{f"model__{k}": v for k, v in params.items()})
+    folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state)
+    scores = cross_val_score(pipe, X_train, y_train, cv=folds, scoring="accuracy", n_jobs=1)
+    pipe.fit(X_train, y_train)
+    return scores, pipe
+
+
+def _best_time(fn, number, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def measure(model, scaler, X_raw):
+    """Serving-path latency and footprint of one fitted forest.
+
+    Latency is measured on the folded flat forest, the engine that serves
+    single applicants in the app and the HTTP service.
+    """
+    forest = fold_scaler(FlatForest.from_sklearn(model), scaler)
+    one = X_raw[:1]
+    batch = X_raw[np.arange(LATENCY_BATCH_ROWS) % len(X_raw)]
+    return {
+        "single_row_us": _best_time(lambda: forest.predict_proba(one), 200) * 1e6,
+        "batch_row_us": _best_time(lambda: forest.predict_proba(batch), 3) * 1e6 / len(batch),
+        "pickle_bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+        "nodes": forest.n_nodes,
+        "max_depth": forest.max_depth,
+    }
+
+
+def pareto_front(rows, maximize="cv_accuracy", minimize=("single_row_us", "pickle_bytes")):
+    """Indices of rows not dominated on accuracy, latency and size."""
+    acc = np.array([r[maximize] for r in rows])
+    costs = np.array([[r[m] for m in minimize] for r in rows], dtype=float)
+    front = []
+    for i in range(len(rows)):
+        no_worse = (acc >= acc[i]) & (costs <= costs[i]).all(axis=1)
+        better = (acc > acc[i]) | (costs < costs[i]).any(axis=1)
+        if not (no_worse & better).any():
+            front.append(i)
+    return front
+
+
+def select(data_path, sweep=None, tolerance=0.01, n_jobs=-1, cv=5, test_size=0.3,
+           random_state=42, export_dir=None):
+    """Run the sweep; returns the report and optionally exports a bundle."""
+    start = time.perf_counter()
+    _, encoders, X, y = load_training_data(data_path)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=random_state, stratify=y,
+    )
+    grid = candidates(sweep)
+    fitted = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_candidate)(params, X_train, y_train, cv, random_state) for params in grid
+    )
+
+    # Timed one at a time in this process so measurements do not contend
+    X_raw = X_test.to_numpy()
+    rows = []
+    for params, (scores, pipe) in zip(grid, fitted):
+        model, scaler = pipe.named_steps["model"], pipe.named_steps["scaler"]
+        row = {"params": params, "cv_accuracy": float(scores.mean()),
+               "cv_std": float(scores.std()),
+               "test_accuracy": float(pipe.score(X_test, y_test))}
+        row.update(measure(model, scaler, X_raw))
+        rows.append(row)
+
+    for i in pareto_front(rows):
+        rows[i]["pareto"] = True
+    best = max(range(len(rows)), key=lambda i: rows[i]["cv_accuracy"])
+    eligible = [i for i, r in enumerate(rows)
+                if r["cv_accuracy"] >= rows[best]["cv_accuracy"] - tolerance]
+    smallest = min(eligible, key=lambda i: (rows[i]["pickle_bytes"], rows[i]["single_row_us"]))
+
+    report = {
+        "data_sha256": file_sha256(data_path),
+        "tolerance": tolerance,
+        "best": rows[best],
+        "selected": rows[smallest],
+        "candidates": sorted(rows, key=lambda r: (-r["cv_accuracy"], r["pickle_bytes"])),
+        "seconds": time.perf_counter() - start,
+    }
+    if export_dir:
+        pipe = fitted[smallest][1]
+        manifest = save_bundle(export_dir, pipe.named_steps["model"], pipe.named_steps["scaler"],
+                               encoders, extra={"selection": {"params": rows[smallest]["params"],
+                                                              "tolerance": tolerance}})
+        report["exported"] = {"directory": export_dir, "bundle_version": manifest["version"]}
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Trade accuracy against forest latency and size.")
+    parser.add_argument("--data", default="Loan_approvals.csv")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="max CV accuracy drop from the best model (default: %(default)s)")
+    parser.add_argument("--report", default="pareto_report.json")
+    parser.add_argument("--export-dir", help="write the selected model as a bundle here")
+    parser.add_argument("-j", "--n-jobs", type=int, default=-1)
+    parser.add_argument("--cv", type=int, default=5)
+    parser.add_argument("--random-state", type=int, default=42)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    report = select(args.data, tolerance=args.tolerance, n_jobs=args.n_jobs, cv=args.cv,
+                    random_state=args.random_state, export_dir=args.export_dir)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    print(f"{'n_est':>5} {'depth':>5} {'alpha':>6} {'cv acc':>7} {'1-row us':>9} "
+          f"{'KB':>7} {'nodes':>6}  pareto")
+    for r in report["candidates"]:
+        if r.get("pareto"):
+            p = r["params"]
+            print(f"{p['n_estimators']:>5} {str(p['max_depth']):>5} {p['ccp_alpha']:>6} "
+                  f"{r['cv_accuracy']:>7.4f} {r['single_row_us']:>9.1f} "
+                  f"{r['pickle_bytes'] / 1024:>7.1f} {r['nodes']:>6}  *")
+    sel = report["selected"]
+    print(f"Selected {sel['params']} (cv accuracy {sel['cv_accuracy']:.4f}, "
+          f"{sel['pickle_bytes'] / 1024:.1f} KB) vs best {report['best']['cv_accuracy']:.4f}; "
+          f"report in {args.report}", file=sys.stderr)
+    if "exported" in report:
+        print(f"Exported bundle {report['exported']['bundle_version']} to {args.export_dir}",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+"""Standalone HTTP/JSON scoring service with request micro-batching.
+
+Usage::
+
+    python -m quantumloan.service --port 8080 --max-batch-size 64 --max-wait-ms 2
+
+Endpoints:
+
+``POST /score``
+    One applicant object (same keys as the ``Loan_approvals.csv`` columns)
+    returns one result object; a JSON list returns ``{"results": [...]}``.
+``GET /healthz``
+    Liveness and the bundle version being served.
+``GET /stats``
+    Request latency p50/p99, batching and prediction-cache counters, and
+    each challenger's agreement with the served bundle.
+``GET /metrics``
+    Stage histograms and prediction counters in the Prometheus text format.
+
+Requests are encoded as they arrive, so a bad applicant only fails its own
+request. Encoded rows that arrive within ``max_wait_ms`` of each other are
+stacked and scored with one forest call. Every decision is queued for the
+audit log (``quantumloan.audit``) and feeds the drift monitor
+(``quantumloan.drift``). With ``--challenger DIR`` (repeatable) the same
+rows are also scored by those bundles off the request path and compared
+with the served decisions (``quantumloan.shadow``); responses only ever
+carry the served bundle's result.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import time
+
+import numpy as np
+
+from .audit import get_audit_log
+from .bundle import get_bundle
+from .drift import get_drift_monitor
+from .cache import get_prediction_cache
+from .features import SchemaMismatchError, encode_records
+from .inference import score_matrix
+from .metrics import REGISTRY, STAGE_SECONDS, count_outcomes
+from .shadow import ShadowScorer, get_shadow_scorer
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+LATENCY_WINDOW = 10_000
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class MicroBatcher:
+    """Groups concurrent scoring requests into one forest evaluation.
+
+    A batch is closed when it holds ``max_batch_size`` rows or when
+    ``max_wait_ms`` has passed since its first request arrived. Rows are
+    scored by the bundle they were encoded with, so a hot swap mid-batch
+    never mixes versions.
+    """
+
+    def __init__(self, bundle_dir=None, max_batch_size=64, max_wait_ms=2.0):
+        self.bundle_dir = bundle_dir
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.rows = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def score(self, bundle, X):
+        """Score a matrix encoded for ``bundle``; resolves once its batch has run."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((bundle, X, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            size = len(items[0][1])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                size += len(item[1])
+
+            # Normally one group; two only across a hot swap
+            groups = {}
+            for item in items:
+                groups.setdefault(id(item[0]), []).append(item)
+            for group in groups.values():
+                await self._score_group(loop, group)
+
+    async def _score_group(self, loop, items):
+        bundle = items[0][0]
+        X = np.vstack([x for _, x, _ in items])
+        try:
+            # Off the event loop so new requests keep queueing meanwhile
+            result = await loop.run_in_executor(None, self._score, bundle, X)
+        except Exception as exc:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        self.batches += 1
+        self.rows += len(X)
+        start = 0
+        for _, x, future in items:
+            stop = start + len(x)
+            if not future.done():
+                future.set_result([result.row(i) for i in range(start, stop)])
+            start = stop
+
+    def _score(self, bundle, X):
+        with STAGE_SECONDS.time(source="service", stage="predict"):
+            return score_matrix(bundle, X)
+
+
+class ScoringService:
+    """Minimal asyncio HTTP/1.1 server around a ``MicroBatcher``."""
+
+    def __init__(self, bundle_dir=None, max_batch_size=64, max_wait_ms=2.0, challenger_dirs=None):
+        self.bundle_dir = bundle_dir
+        self.batcher = MicroBatcher(bundle_dir, max_batch_size, max_wait_ms)
+        self.latencies_ms = collections.deque(maxlen=LATENCY_WINDOW)
+        self.cache = get_prediction_cache()
+        self.audit_log = get_audit_log()
+        self.shadow = ShadowScorer(challenger_dirs) if challenger_dirs else get_shadow_scorer()
+        self.requests = 0
+        self.errors = 0
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=8080):
+        get_bundle(self.bundle_dir)  # load before accepting traffic
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    def stats(self):
+        lat = np.fromiter(self.latencies_ms, dtype=np.float64)
+        p50, p99 = np.percentile(lat, [50, 99]) if len(lat) else (None, None)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ms": {"p50": p50, "p99": p99, "window": len(lat)},
+            "batches": self.batcher.batches,
+            "rows_scored": self.batcher.rows,
+            "mean_batch_rows": self.batcher.rows / self.batcher.batches if self.batcher.batches else None,
+            "bundle_version": get_bundle(self.bundle_dir).version,
+            "cache": self.cache.stats(),
+            "shadow": self.shadow.stats() if self.shadow is not None else None,
+        }
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                start = time.perf_counter()
+                status, payload = await self._dispatch(method, path, body)
+                if path == "/score":
+                    self.requests += 1
+                    self.errors += status >= 400
+                    self.latencies_ms.append((time.perf_counter() - start) * 1000.0)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        try:
+            if path == "/score" and method == "POST":
+                return 200, await self._score(body)
+            if path == "/healthz" and method == "GET":
+                return 200, {"status": "ok", "bundle_version": get_bundle(self.bundle_dir).version}
+            if path == "/stats" and method == "GET":
+                return 200, self.stats()
+            if path == "/metrics" and method == "GET":
+                return 200, REGISTRY.render()
+            raise HTTPError(404, f"no route for {method} {path}")
+        except HTTPError as exc:
+            return exc.status, {"error": exc.message}
+        except Exception as exc:
+            logger.exception("Scoring failed")
+            return 500, {"error": str(exc)}
+
+    async def _score(self, body):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, "body is not valid JSON")
+        single = isinstance(payload, dict)
+        records = [payload] if single else payload
+        if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+            raise HTTPError(400, "expected an applicant object or a non-empty list of them")
+        try:
+            bundle = get_bundle(self.bundle_dir)
+            with STAGE_SECONDS.time(source="service", stage="encode"):
+                X = encode_records(records, bundle.encoders)
+        except (SchemaMismatchError, ValueError) as exc:
+            raise HTTPError(400, str(exc))
+        # Only cache misses go through the micro-batcher
+        keys, rows, misses = self.cache.get_many(bundle.version, X)
+        if misses:
+            scored = await self.batcher.score(bundle, X[misses])
+            for row, i in zip(scored, misses):
+                rows[i] = row
+                self.cache.put(bundle.version, keys[i], row)
+        approved = np.array([row["decision"] == "Approved" for row in rows])
+        probs = [row["approval_probability"] for row in rows]
+        count_outcomes("service", approved)
+        if self.audit_log is not None:
+            self.audit_log.record(X, approved, [row["confidence"] for row in rows], probs,
+                                  version=bundle.version, source="service")
+        monitor = get_drift_monitor(bundle)
+        if monitor is not None:
+            monitor.update(X, probs)
+        if self.shadow is not None:
+            self.shadow.submit(bundle, X, approved, probs)
+        return rows[0] if single else {"results": rows}
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        # Strings are sent as-is (the /metrics exposition), everything else as JSON
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                  413: "Payload Too Large", 500: "Internal Server Error"}.get(status, "")
+        head = (
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve loan scoring over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=64,
+                        help="rows per forest call (default: %(default)s)")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0,
+                        help="how long a batch waits for more requests (default: %(default)s)")
+    parser.add_argument("--bundle-dir", default=None)
+    parser.add_argument("--challenger", action="append", metavar="DIR",
+                        help="also score every request with this bundle, off the request path, "
+                             "and report its agreement in /stats (repeatable)")
+    return parser
+
+
+async def _serve(args):
+    service = ScoringService(args.bundle_dir, args.max_batch_size, args.max_wait_ms,
+                             challenger_dirs=args.challenger)
+    host, port = await service.start(args.host, args.port)
+    logger.warning("Scoring service listening on http://%s:%s", host, port)
+    await service.serve_forever()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        asyncio.run(_serve(build_parser().parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
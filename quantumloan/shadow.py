@@ -0,0 +1,231 @@
+"""Shadow scoring of challenger bundles against the serving (champion) bundle.
+
+Set ``QUANTUMLOAN_CHALLENGER_DIRS`` (bundle directories separated by
+``os.pathsep``) for the app, or pass ``--challenger DIR`` to
+``quantumloan.service`` and ``quantumloan.batch``. Callers keep scoring with
+the champion as before and hand its decisions to ``ShadowScorer.submit``,
+which only queues them: a background thread stacks the queued rows into one
+matrix and runs every challenger over it, so the champion's latency does not
+change and each challenger costs one forest pass per batch rather than one
+per request.
+
+The rows are the champion's encoded matrix, so feature construction is
+shared; a challenger whose schema encodes features differently is skipped.
+Challengers with a folded forest read the encoded rows directly, the others
+share one scaled copy per distinct scaler.
+
+Per challenger it keeps the rows compared, the decision agreement rate,
+approvals gained and lost, the mean absolute difference in approval
+probability and the forest time per row (``stats()``, ``GET /stats`` on the
+service), and records ``quantumloan_shadow_rows`` and
+``quantumloan_shadow_seconds`` in ``quantumloan.metrics``. The champion's
+own time is the ``predict`` stage of ``quantumloan_stage_seconds``.
+
+When the challengers fall behind, ``submit`` drops the rows (counted in
+``dropped_rows``) instead of slowing the caller; ``block=True`` waits.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .bundle import get_bundle
+from .features import scale_matrix
+from .forest import FLAT_MAX_ROWS
+from .inference import ScoreResult
+from .metrics import SHADOW_DROPPED, SHADOW_ROWS, SHADOW_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CHALLENGER_DIRS = [d for d in os.environ.get("QUANTUMLOAN_CHALLENGER_DIRS", "").split(os.pathsep)
+                   if d]
+# Rows stacked into one challenger pass; the flat forests' fast path
+BATCH_ROWS = FLAT_MAX_ROWS
+# Queued submit() calls before rows are dropped
+MAX_PENDING = 10_000
+
+
+def _scaler_key(scaler):
+    return (np.asarray(scaler.mean_).tobytes(), np.asarray(scaler.scale_).tobytes(),
+            getattr(scaler, "with_mean", True), getattr(scaler, "with_std", True))
+
+
+def _predict(bundle, X, scaled):
+    # scaled: scaled copies of X by scaler, shared by the challengers of one batch
+    if bundle.folded is not None and len(X) <= FLAT_MAX_ROWS:
+        return bundle.folded.predict_proba(X)
+    key = _scaler_key(bundle.scaler)
+    if key not in scaled:
+        scaled[key] = scale_matrix(X, bundle.scaler)
+    return bundle.predict_proba(scaled[key])
+
+
+class _Comparison:
+    """Running agreement and latency totals of one challenger."""
+
+    def __init__(self):
+        self.version = None
+        self.rows = 0
+        self.agreed = 0
+        self.gained = 0
+        self.lost = 0
+        self.abs_diff = 0.0
+        self.seconds = 0.0
+        self.batches = 0
+        self.skipped_rows = 0
+        self.errors = 0
+
+    def add(self, version, approved, proba, result, seconds):
+        self.version = version
+        agree = int((result.approved == approved).sum())
+        self.rows += len(approved)
+        self.agreed += agree
+        self.gained += int((result.approved & ~approved).sum())
+        self.lost += int((approved & ~result.approved).sum())
+        self.abs_diff += float(np.abs(result.approval_probability - proba).sum())
+        self.seconds += seconds
+        self.batches += 1
+        SHADOW_ROWS.inc(agree, challenger=version, agreement="agree")
+        SHADOW_ROWS.inc(len(approved) - agree, challenger=version, agreement="disagree")
+        SHADOW_SECONDS.observe(seconds, challenger=version)
+
+    def summary(self):
+        rows = self.rows
+        return {
+            "version": self.version,
+            "rows": rows,
+            "agreement": self.agreed / rows if rows else None,
+            "approvals_gained": self.gained,
+            "approvals_lost": self.lost,
+            "mean_abs_probability_diff": self.abs_diff / rows if rows else None,
+            "seconds_per_row": self.seconds / rows if rows else None,
+            "seconds_per_batch": self.seconds / self.batches if self.batches else None,
+            "skipped_rows": self.skipped_rows,
+            "errors": self.errors,
+        }
+
+
+class ShadowScorer:
+    """Scores queued champion decisions with each challenger on a background thread."""
+
+    def __init__(self, challenger_dirs, batch_rows=BATCH_ROWS, max_pending=MAX_PENDING):
+        self.challenger_dirs = [os.path.abspath(d) for d in challenger_dirs]
+        self.batch_rows = batch_rows
+        self.dropped_rows = 0
+        self._comparisons = {d: _Comparison() for d in self.challenger_dirs}
+        self._queue = queue.Queue(max_pending)
+        for directory in self.challenger_dirs:
+            get_bundle(directory)  # fail at start-up, not on the first batch
+        self._thread = threading.Thread(target=self._run, name="quantumloan-shadow", daemon=True)
+        self._thread.start()
+
+    def submit(self, bundle, X, approved, approval_probability, block=False):
+        """Queue the champion ``bundle``'s decisions for encoded matrix ``X``."""
+        entry = (bundle.schema.get("id"), np.array(X, dtype=np.float64, ndmin=2),
+                 np.asarray(approved, dtype=bool).reshape(-1),
+                 np.asarray(approval_probability, dtype=np.float64).reshape(-1))
+        try:
+            self._queue.put(entry, block=block)
+        except queue.Full:
+            self.dropped_rows += len(entry[1])
+            SHADOW_DROPPED.inc(len(entry[1]))
+
+    def submit_result(self, bundle, X, result, block=False):
+        """Queue the rows of the champion's ``ScoreResult`` for ``X``."""
+        self.submit(bundle, X, result.approved, result.approval_probability, block=block)
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been compared."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Compare what is queued and stop the worker."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "dropped_rows": self.dropped_rows,
+            "challengers": {d: c.summary() for d, c in self._comparisons.items()},
+        }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            pending, n_rows = [], 0
+            # Stack whatever else is already queued, up to one batch
+            while isinstance(item, tuple):
+                pending.append(item)
+                n_rows += len(item[1])
+                if n_rows >= self.batch_rows:
+                    item = ()
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = ()
+                    break
+            # Rows from before and after a champion reload can differ in schema
+            for schema_id in dict.fromkeys(e[0] for e in pending):
+                group = [e for e in pending if e[0] == schema_id]
+                self._compare(schema_id, np.vstack([e[1] for e in group]),
+                              np.concatenate([e[2] for e in group]),
+                              np.concatenate([e[3] for e in group]))
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _compare(self, schema_id, X, approved, proba):
+        scaled = {}
+        for directory, comparison in self._comparisons.items():
+            try:
+                bundle = get_bundle(directory)
+                if bundle.schema.get("id") != schema_id:
+                    comparison.skipped_rows += len(X)
+                    continue
+                start = time.perf_counter()
+                result = ScoreResult(bundle, _predict(bundle, X, scaled))
+                comparison.add(bundle.version, approved, proba, result,
+                               time.perf_counter() - start)
+            except Exception:
+                logger.exception("Shadow scoring with %s failed", directory)
+                comparison.errors += 1
+
+
+def format_stats(stats):
+    lines = [f"{'challenger':<12} {'rows':>8} {'agree':>7} {'gained':>7} {'lost':>7} "
+             f"{'|dp|':>7} {'us/row':>8}"]
+    for directory, s in stats["challengers"].items():
+        if not s["rows"]:
+            lines.append(f"{s['version'] or directory:<12} {0:>8}")
+            continue
+        lines.append(f"{s['version']:<12} {s['rows']:>8} {s['agreement']:>7.2%} "
+                     f"{s['approvals_gained']:>7} {s['approvals_lost']:>7} "
+                     f"{s['mean_abs_probability_diff']:>7.4f} {s['seconds_per_row'] * 1e6:>8.1f}")
+    return "\n".join(lines)
+
+
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def get_shadow_scorer():
+    """The process-wide scorer for ``CHALLENGER_DIRS``, or ``None`` without any."""
+    global _scorer
+    if not CHALLENGER_DIRS:
+        return None
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                _scorer = ShadowScorer(CHALLENGER_DIRS)
+                atexit.register(_scorer.close)
+    return _scorer
@@ -0,0 +1,42 @@
+"""Per-stage wall-clock timing for the prediction path."""
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Times named stages in order and optionally reports each as it ends.
+
+    ``on_stage(name, index)`` is called after every stage completes, which
+    lets a progress bar follow the real work instead of a fixed animation.
+    With a ``histogram`` (see ``quantumloan.metrics``) every stage is also
+    observed under ``stage=name`` plus ``labels``.
+    """
+
+    def __init__(self, on_stage=None, histogram=None, labels=None):
+        self.on_stage = on_stage
+        self.histogram = histogram
+        self.labels = labels or {}
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = elapsed * 1000.0
+            if self.histogram is not None:
+                self.histogram.observe(elapsed, stage=name, **self.labels)
+            if self.on_stage is not None:
+                self.on_stage(name, len(self.timings) - 1)
+
+    @property
+    def total_ms(self):
+        return sum(self.timings.values())
+
+    def summary(self):
+        """Human-readable ``stage: 1.23 ms`` list, in stage order."""
+        parts = [f"{name}: {ms:.2f} ms" for name, ms in self.timings.items()]
+        parts.append(f"total: {self.total_ms:.2f} ms")
+        return " · ".join(parts)
@@ -0,0 +1,234 @@
+"""Headless, reproducible training of the loan approval bundle.
+
+Usage::
+
+    python -m quantumloan.train --data Loan_approvals.csv --output-dir . --n-jobs -1
+
+Runs the same steps as ``train_model.ipynb`` (label encoding, scaling,
+imputation, SMOTE, random forest) as one imblearn pipeline. The pipeline is
+tuned with a cross-validated grid search spread over ``--n-jobs`` cores, and
+the run writes one versioned bundle plus ``training_report.json`` and the
+drift monitor's reference profile of the training rows. The tuned pipeline
+is then cross-validated on all rows with ``--cv-repeats`` repeats of
+stratified k-fold (see ``quantumloan.evaluation``), written to
+``evaluation_report.json``.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import (
+    accuracy_score, classification_report, confusion_matrix, f1_score, roc_auc_score,
+)
+from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from .bundle import save_bundle
+from .dataset import load_dataset
+from .drift import build_profile, write_profile
+from .evaluation import (
+    COST_FALSE_APPROVAL, COST_FALSE_REJECTION, EVALUATION_FILE, approved_target, evaluate_cv,
+    format_summary, write_report,
+)
+from .features import FEATURE_COLUMNS, TARGET_COLUMN, scale_matrix
+from .inference import APPROVED_LABEL
+
+REPORT_FILE = "training_report.json"
+
+PARAM_GRID = {
+    "model__n_estimators": [100, 200, 400],
+    "model__max_depth": [None, 6, 12],
+    "model__min_samples_leaf": [1, 2, 4],
+    "model__max_features": ["sqrt", 0.5],
+}
+
+
+def _require_imblearn():
+    try:
+        from imblearn.over_sampling import SMOTE
+        from imblearn.pipeline import Pipeline
+    except ImportError as exc:
+        raise ImportError(
+            "Training needs imbalanced-learn (pip install -r requirements.txt)"
+        ) from exc
+    return SMOTE, Pipeline
+
+
+def build_pipeline(random_state=42):
+    """Scaler -> imputer -> SMOTE -> forest, as in the notebook.
+
+    Missing values are filled with 0 after scaling, which is the training
+    mean in scaled space and exactly what ``scale_matrix`` does at serving
+    time. SMOTE only runs during ``fit``, so it never leaks into CV folds.
+    """
+    SMOTE, Pipeline = _require_imblearn()
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("imputer", SimpleImputer(strategy="constant", fill_value=0.0)),
+        ("smote", SMOTE(random_state=random_state)),
+        ("model", RandomForestClassifier(random_state=random_state)),
+    ])
+
+
+def load_training_data(path):
+    """Load a training CSV through its columnar cache.
+
+    Returns (dataset, encoders, X frame, y); see ``quantumloan.dataset``.
+    """
+    dataset = load_dataset(path)
+    encoders = dataset.fit_encoders()
+    X = pd.DataFrame(dataset.encoded(encoders), columns=FEATURE_COLUMNS)
+    y = dataset.target(encoders[TARGET_COLUMN])
+    return dataset, encoders, X, y
+
+
+def evaluate(model, scaler, X, y):
+    """Hold-out metrics computed through the serving feature path."""
+    proba = model.predict_proba(scale_matrix(X, scaler))
+    y_pred = model.classes_.take(proba.argmax(axis=1))
+    return {
+        "accuracy": accuracy_score(y, y_pred),
+        "f1": f1_score(y, y_pred),
+        "roc_auc": roc_auc_score(y, proba[:, 1]) if len(np.unique(y)) > 1 else None,
+        "confusion_matrix": confusion_matrix(y, y_pred).tolist(),
+        "classification_report": classification_report(y, y_pred, output_dict=True, zero_division=0),
+    }
+
+
+def train(data_path, output_dir=".", n_jobs=-1, cv=5, test_size=0.3, random_state=42,
+          param_grid=None, scoring="accuracy", cv_repeats=3,
+          costs=(COST_FALSE_APPROVAL, COST_FALSE_REJECTION)):
+    """Fit, tune and write a bundle; returns the metrics report.
+
+    With ``cv_repeats`` the tuned parameters are also evaluated out of fold
+    and the summary is added to the report as ``"cv_evaluation"``.
+    """
+    start = time.perf_counter()
+    dataset, encoders, X, y = load_training_data(data_path)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=random_state, stratify=y,
+    )
+
+    search = GridSearchCV(
+        build_pipeline(random_state),
+        param_grid or PARAM_GRID,
+        scoring=scoring,
+        cv=StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state),
+        n_jobs=n_jobs,
+        refit=True,
+    )
+    search.fit(X_train, y_train)
+    search_seconds = time.perf_counter() - start
+
+    best = search.best_estimator_
+    scaler = best.named_steps["scaler"]
+    model = best.named_steps["model"]
+
+    report = {
+        "data": {"path": os.path.abspath(data_path), "sha256": dataset.sha256,
+                 "rows": len(dataset), "train_rows": len(X_train), "test_rows": len(X_test)},
+        "search": {
+            "scoring": scoring,
+            "cv_folds": cv,
+            "candidates": len(search.cv_results_["params"]),
+            "best_params": search.best_params_,
+            "best_cv_score": search.best_score_,
+            "n_jobs": n_jobs,
+            "cpu_count": os.cpu_count(),
+            "seconds": search_seconds,
+        },
+        "test": evaluate(model, scaler, X_test, y_test),
+        "random_state": random_state,
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    # What serving traffic is compared with (see quantumloan.drift)
+    approved = list(encoders[TARGET_COLUMN].classes_).index(APPROVED_LABEL)
+    proba = model.predict_proba(scale_matrix(X_train, scaler))
+    write_profile(output_dir, build_profile(
+        np.asarray(X_train, dtype=np.float64),
+        proba[:, int(np.flatnonzero(model.classes_ == approved)[0])], encoders,
+    ))
+    manifest = save_bundle(output_dir, model, scaler, encoders, extra={
+        "trained_at": report["trained_at"],
+        "data_sha256": report["data"]["sha256"],
+        "best_params": search.best_params_,
+        # Where incremental updates pick up (see quantumloan.incremental)
+        "lineage": [{
+            "kind": "full",
+            "trained_at": report["trained_at"],
+            "data_sha256": report["data"]["sha256"],
+            "data_bytes": os.path.getsize(data_path),
+            "data_rows": len(dataset),
+            "n_estimators": len(model.estimators_),
+        }],
+    })
+    report["bundle_version"] = manifest["version"]
+
+    if cv_repeats:
+        evaluation = {"data": dict(report["data"],
+                                   approved_rate=float(approved_target(y, encoders).mean())),
+                      "bundle_version": manifest["version"]}
+        evaluation.update(evaluate_cv(
+            X.to_numpy(), approved_target(y, encoders), search.best_params_, n_splits=cv,
+            n_repeats=cv_repeats, n_jobs=n_jobs, random_state=random_state, costs=costs,
+        ))
+        write_report(os.path.join(output_dir, EVALUATION_FILE), evaluation)
+        report["cv_evaluation"] = {
+            "summary": format_summary(evaluation),
+            "metrics": {name: {k: m[k] for k in ("mean", "std")}
+                        for name, m in evaluation["metrics"].items()},
+            "cost_threshold": evaluation["cost_threshold"],
+        }
+    report["wall_seconds"] = time.perf_counter() - start
+
+    with open(os.path.join(output_dir, REPORT_FILE), "w") as f:
+        json.dump(report, f, indent=2, default=float)
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Train and write the loan approval bundle.")
+    parser.add_argument("--data", default="Loan_approvals.csv")
+    parser.add_argument("--output-dir", default=".",
+                        help="bundle directory; the app hot-reloads it (default: %(default)s)")
+    parser.add_argument("-j", "--n-jobs", type=int, default=-1,
+                        help="parallel CV fits, -1 for all cores (default: %(default)s)")
+    parser.add_argument("--cv", type=int, default=5)
+    parser.add_argument("--test-size", type=float, default=0.3)
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--scoring", default="accuracy")
+    parser.add_argument("--cv-repeats", type=int, default=3,
+                        help="repeats of the out-of-fold evaluation, 0 to skip (default: %(default)s)")
+    parser.add_argument("--cost-false-approval", type=float, default=COST_FALSE_APPROVAL)
+    parser.add_argument("--cost-false-rejection", type=float, default=COST_FALSE_REJECTION)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    report = train(args.data, args.output_dir, n_jobs=args.n_jobs, cv=args.cv,
+                   test_size=args.test_size, random_state=args.random_state,
+                   scoring=args.scoring, cv_repeats=args.cv_repeats,
+                   costs=(args.cost_false_approval, args.cost_false_rejection))
+    test = report["test"]
+    print(
+        f"Bundle {report['bundle_version']} written to {args.output_dir}: "
+        f"test accuracy {test['accuracy']:.4f}, ROC AUC {test['roc_auc']:.4f}; "
+        f"{report['search']['candidates']} candidates in {report['search']['seconds']:.1f} s",
+        file=sys.stderr,
+    )
+    if "cv_evaluation" in report:
+        print(report["cv_evaluation"]["summary"], file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from quantumloan.audit import AuditLog, read_log
+from quantumloan.features import FEATURE_COLUMNS
+
+N_FEATURES = len(FEATURE_COLUMNS)
+
+
+@pytest.fixture
+def audit_log(tmp_path):
+    log = AuditLog(str(tmp_path), flush_interval=60, fsync=False)
+    yield log
+    log.close(timeout=5)
+
+
+def test_malformed_record_raises_in_caller(audit_log, tmp_path):
+    audit_log.record(np.zeros((1, N_FEATURES)), True, 0.9, 0.9, version="v1")
+    with pytest.raises(ValueError):
+        audit_log.record(np.zeros((1, 5)), True, 0.9, 0.9, version="v1")
+    with pytest.raises(ValueError):
+        audit_log.record(np.zeros((3, N_FEATURES)), [True, False], 0.9, version="v1")
+    audit_log.record(np.ones((2, N_FEATURES)), [True, False], [0.8, 0.7], [0.8, 0.3],
+                     version="v1")
+    assert audit_log.flush(timeout=5)
+    records = read_log(str(tmp_path))
+    assert len(records) == 3
+    assert records.approved.tolist() == [True, True, False]
+
+
+def test_writer_survives_a_block_it_cannot_encode(audit_log, tmp_path):
+    # Bypasses record()'s checks: rows of different widths cannot be stacked
+    audit_log._queue.put((0.0, np.zeros((1, N_FEATURES)), True, 0.9, 0.9, "v1", "app", ""))
+    audit_log._queue.put((0.0, np.zeros((1, 5)), True, 0.9, 0.9, "v1", "app", ""))
+    assert audit_log.flush(timeout=5)
+    assert audit_log.dropped_rows == 2
+    assert audit_log.write_errors == 1
+    audit_log.record(np.zeros((1, N_FEATURES)), True, 0.9, 0.9, version="v1")
+    assert audit_log.flush(timeout=5)
+    assert len(read_log(str(tmp_path))) == 1
+
+
+def test_record_drops_once_the_writer_stopped(audit_log):
+    audit_log.close(timeout=5)
+    audit_log.record(np.zeros((4, N_FEATURES)), True, 0.9, version="v1")
+    assert audit_log.dropped_rows == 4
+    assert not audit_log.flush()
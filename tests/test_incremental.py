@@ -0,0 +1,40 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from quantumloan.bundle import read_manifest
+from quantumloan.incremental import IncrementalError, update
+from quantumloan.train import train
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "Loan_approvals.csv")
+SMALL_GRID = {"model__n_estimators": [10], "model__max_depth": [5]}
+
+
+@pytest.fixture
+def trained(tmp_path):
+    data = str(tmp_path / "loans.csv")
+    shutil.copyfile(DATA, data)
+    bundle_dir = str(tmp_path / "bundle")
+    os.makedirs(bundle_dir)
+    train(data, bundle_dir, n_jobs=1, cv=2, param_grid=SMALL_GRID, cv_repeats=0)
+    return data, bundle_dir
+
+
+def test_mean_drift_refuses_the_update(trained):
+    data, bundle_dir = trained
+    appended = pd.read_csv(DATA).sample(60, random_state=0)
+    appended["ApplicantIncome"] *= 20
+    appended.to_csv(data, mode="a", header=False, index=False)
+    before = {name: os.path.getmtime(os.path.join(bundle_dir, name))
+              for name in os.listdir(bundle_dir)}
+
+    with pytest.raises(IncrementalError, match="ApplicantIncome mean moved"):
+        update(data, bundle_dir)
+
+    after = {name: os.path.getmtime(os.path.join(bundle_dir, name))
+             for name in os.listdir(bundle_dir)}
+    assert after == before
+    assert len(read_manifest(bundle_dir)["lineage"]) == 1